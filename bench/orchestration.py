@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Benchmarks the orchestration of installs without any cloud
+
+Installs 1, 10 and 50 profiles (or --sizes) against the local stand-ins of
+bench/standins.py: installer mirror, route53, openstack, Kubernetes API,
+acme.sh and openshift-install. Reports the wall clock time, the time spent in
+each step and the calls made to every service per profile, and fails if a
+profile failed or one of them is over budget.
+
+The profiles run one per CPU by default (--parallel) so the time budgets are
+fixed and don't depend on the machine being busy, they can be changed with
+--budget-ms and --step-budget-ms.
+
+  python bench/orchestration.py [--sizes 1 10 50] [--delay 0.05] [--budget-ms 500] [--step-budget-ms download=100] [--json out.json]
+"""
+import argparse
+import collections
+import json
+import math
+import os
+import pathlib
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# pylint: disable=wrong-import-position
+import main as moumoustall  # noqa: E402
+import standins  # noqa: E402
+from lib import downloader, scheduler, template  # noqa: E402
+
+BASE_DOMAIN = "bench.example.com"
+HTPASSWD_USERS = 50
+
+# the most calls a profile is expected to make to each service
+CALL_BUDGETS = {
+    'acme': 2,
+    'installer': 1,
+    'kube': 6,
+    'mirror': 4,
+    'openstack': 3,
+    'route53': 4,
+}
+# the steps other than create-cluster, which is checked with the overhead
+STEP_BUDGETS_MS = {
+    'download': 100,
+    'cleanup': 50,
+    'floating-ips': 50,
+    'dns': 50,
+    'template': 50,
+    'post-install': 200,
+}
+
+
+def setup(workdir, size):
+    config = workdir / "config"
+    config.mkdir(parents=True)
+    shutil.copy(ROOT / "config" / "install-default.yaml", config)
+    (config / "pull.secret.json").write_text('{"auths": {}}')
+    (config / "htpasswd").write_text("".join(
+        f"user{i}:$apr1$bench$bench\n" for i in range(HTPASSWD_USERS)))
+    return {
+        f"profile{i}": {
+            'clusterName': f"bench{i}",
+            'baseDomain': BASE_DOMAIN,
+            'osCloud': "bench",
+            'openstackBackend': "fake",
+            'externalNetwork': "public",
+            'installerVersion': "latest-4.5",
+            'installer_channel': "prod",
+            'template': "default",
+            'pullRequestJsonFile': "pull.secret.json",
+            'htpasswd': "htpasswd",
+        }
+        for i in range(size)
+    }
+
+
+def step_durations(workdir):
+    result = collections.defaultdict(list)
+    for events in (workdir / "installs").glob("*/events.jsonl"):
+        for line in events.read_text().splitlines():
+            event = json.loads(line)
+            if event['event'] == 'step_end':
+                result[event['step']].append(event['duration'])
+    return result
+
+
+def run(size, delay, parallel):
+    parallel = min(parallel, size)
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix="moumoustall-bench-"))
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        configs = setup(workdir, size)
+        calls = standins.Calls(workdir / "calls")
+        server = standins.Server(calls, downloader._current_platform())
+        downloader.SOURCES['prod'] = server.url + "/ocp/"
+        standins.install(calls, server, BASE_DOMAIN, workdir)
+        os.environ["FAKE_INSTALLER_DELAY"] = str(delay)
+
+        args = argparse.Namespace(metrics_dir=None,
+                                  no_install=False,
+                                  offline=False,
+                                  post_install_script=None,
+                                  resume=False,
+                                  retries=0,
+                                  uninstall=False)
+        start = time.monotonic()
+        rendered, errors = template.render_all(configs)
+        if errors:
+            raise Exception(f"Invalid templates: {errors}")
+        failed = scheduler.run_profiles(moumoustall.doprofile, args,
+                                        list(configs.items()), parallel)
+        wall = time.monotonic() - start
+        server.close()
+
+        for name in failed:
+            log = workdir / "installs" / configs[name][
+                'clusterName'] / "moumoustall.log"
+            print(f"💥 {name} failed:\n{log.read_text()[-2000:]}")
+
+        steps = step_durations(workdir)
+        installer = delay * standins.FAKE_PHASES
+        counts = calls.counts()
+        return {
+            'profiles': size,
+            'parallel': parallel,
+            'rendered': len(rendered),
+            'failed': failed,
+            'wall': wall,
+            'installer': installer,
+            'steps': {
+                name: statistics.mean(durations)
+                for name, durations in steps.items()
+            },
+            # time not spent waiting for the fake installer
+            'overhead': statistics.mean(
+                sum(durations[i] for durations in steps.values()
+                    if i < len(durations))
+                for i in range(size)) - installer,
+            'calls': {
+                key: value / size
+                for key, value in sorted(counts.items())
+            },
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def report(result):
+    print(f"\n⏱  {result['profiles']} profiles in {result['wall']:.2f}s, "
+          f"{result['overhead'] * 1000:.0f}ms of orchestration per profile")
+    for name, duration in result['steps'].items():
+        print(f"   {name:<16} {duration * 1000:9.1f}ms")
+    print("   calls per profile:")
+    for name, count in result['calls'].items():
+        if ' ' not in name:
+            print(f"   {name:<16} {count:9.2f}")
+    for name, count in result['calls'].items():
+        if ' ' in name:
+            print(f"     {name:<40} {count:6.2f}")
+
+
+def over_budget(result, budget_ms, step_budgets_ms):
+    """Returns what is over budget in result"""
+    over = []
+    # the profiles run in waves of result['parallel']
+    waves = math.ceil(result['profiles'] / result['parallel'])
+    wall = (result['wall'] - waves * result['installer']) * 1000
+    if wall > budget_ms * waves:
+        over.append(f"wall clock {wall:.0f}ms over the installer "
+                    f"(budget {budget_ms * waves:.0f}ms)")
+    if result['overhead'] * 1000 > budget_ms:
+        over.append(f"orchestration {result['overhead'] * 1000:.0f}ms "
+                    f"per profile (budget {budget_ms:.0f}ms)")
+    for name, duration in result['steps'].items():
+        budget = step_budgets_ms.get(name)
+        if budget is not None and duration * 1000 > budget:
+            over.append(f"{name} {duration * 1000:.0f}ms "
+                        f"(budget {budget:.0f}ms)")
+    for name, budget in CALL_BUDGETS.items():
+        if result['calls'].get(name, 0) > budget:
+            over.append(f"{result['calls'][name]:.2f} {name} calls per "
+                        f"profile (budget {budget})")
+    return over
+
+
+def step_budget(value):
+    name, budget = value.split('=', 1)
+    return name, float(budget)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--delay",
+                        type=float,
+                        default=0.05,
+                        help="seconds the fake installer spends per phase")
+    parser.add_argument("--parallel",
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help="max profiles at the same time, one per CPU by "
+                        "default")
+    parser.add_argument("--budget-ms",
+                        type=float,
+                        default=500,
+                        help="orchestration time allowed per profile on "
+                        "top of the fake installer")
+    parser.add_argument("--step-budget-ms",
+                        type=step_budget,
+                        action="append",
+                        default=[],
+                        metavar="STEP=MS",
+                        help="time allowed for a step, can be repeated")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    for size in args.sizes:
+        result = run(size, args.delay, args.parallel)
+        report(result)
+        result['over_budget'] = over_budget(
+            result, args.budget_ms,
+            dict(STEP_BUDGETS_MS, **dict(args.step_budget_ms)))
+        for over in result['over_budget']:
+            print(f"💥 {size} profiles: {over}")
+        if result['failed']:
+            print(f"💥 {size} profiles: {', '.join(result['failed'])} failed")
+        failed = failed or bool(result['failed'] or result['over_budget'])
+        results.append(result)
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, indent=2))
+    if not failed:
+        print("\n✅ All the runs are within budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
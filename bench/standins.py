@@ -0,0 +1,295 @@
+"""Local stand-ins for the services an install talks to
+
+- a local HTTP server serving an installer mirror listing, a fake
+  openshift-install tarball and its sha256sum.txt, and answering the
+  Kubernetes API calls of the post install tasks
+- a fake route53 client
+- the fake openstack backend of lib.neutron
+- a fake openshift-install going through the install phases in its log and
+  counting the commands it ran
+- a fake acme.sh issuing self signed certificates with openssl
+
+The calls made to them are counted, including the ones made by the forked
+profile workers which append them to a shared file.
+"""
+import collections
+import gzip
+import hashlib
+import http.server
+import io
+import json
+import os
+import pathlib
+import tarfile
+import threading
+
+from lib import neutron, route53
+
+VERSION = "4.5.3"
+
+FAKE_INSTALLER = '''#!/usr/bin/env python3
+import datetime
+import json
+import os
+import pathlib
+import sys
+import time
+
+PHASES = [
+    ("debug", "Consuming Install Config from target directory"),
+    ("info", "Creating infrastructure resources..."),
+    ("info", "Waiting up to 20m0s for the Kubernetes API at https://api:6443..."),
+    ("info", "Waiting up to 40m0s for bootstrapping to complete..."),
+    ("info", "Destroying the bootstrap resources..."),
+    ("info", "Waiting up to 30m0s for the cluster at https://api:6443 to initialize..."),
+    ("info", "Waiting up to 10m0s for the openshift-console route to be created..."),
+    ("info", "Install complete!"),
+]
+
+args = sys.argv[1:]
+if args[:1] == ["version"]:
+    print("openshift-install %(version)s")
+    print("release image quay.io/openshift-release-dev/ocp-release@sha256:0")
+    sys.exit(0)
+
+directory = pathlib.Path(
+    [arg.split("=", 1)[1] for arg in args if arg.startswith("--dir=")][0])
+delay = float(os.environ.get("FAKE_INSTALLER_DELAY", "0.05"))
+if os.environ.get("FAKE_CALLS"):
+    with open(os.environ["FAKE_CALLS"], "a") as fp:
+        command = " ".join(arg for arg in args if not arg.startswith("-"))
+        fp.write(f"installer {command}\\n")
+
+
+def log(level, msg):
+    with (directory / ".openshift_install.log").open("a") as fp:
+        now = datetime.datetime.utcnow().isoformat()
+        fp.write(f'time="{now}Z" level={level} msg="{msg}"\\n')
+
+
+if args[:2] == ["create", "cluster"]:
+    (directory / "install-config.yaml").unlink()
+    for number, (level, msg) in enumerate(PHASES):
+        log(level, msg)
+        if number == 1:
+            (directory / "metadata.json").write_text(json.dumps({
+                "clusterName": directory.name,
+                "infraID": directory.name + "-fake",
+            }))
+            (directory / "auth").mkdir(exist_ok=True)
+            (directory / "auth" / "kubeconfig").write_text(
+                os.environ["FAKE_KUBECONFIG"])
+        time.sleep(delay)
+elif args[:2] == ["destroy", "cluster"]:
+    time.sleep(delay)
+    (directory / "metadata.json").unlink()
+else:
+    time.sleep(delay)
+'''
+FAKE_PHASES = 8
+
+FAKE_ACME = """#!/bin/sh
+echo "acme $1" >> '%(calls)s'
+[ "$1" = "--install-cert" ] || exit 0
+while [ $# -gt 0 ]; do
+    case $1 in
+        --cert-file) cert=$2 ;;
+        --key-file) key=$2 ;;
+        --fullchain-file) fullchain=$2 ;;
+        --ca-file) ca=$2 ;;
+    esac
+    shift
+done
+openssl req -x509 -newkey ec -pkeyopt ec_paramgen_curve:prime256v1 -nodes \
+    -days 90 -subj /CN=bench -keyout "$key" -out "$cert" 2>/dev/null
+cp "$cert" "$fullchain"
+cp "$cert" "$ca"
+"""
+
+KUBECONFIG = """apiVersion: v1
+clusters:
+- cluster: {server: '%s'}
+  name: fake
+contexts:
+- context: {cluster: fake, user: admin}
+  name: admin
+current-context: admin
+users:
+- name: admin
+  user: {token: fake}
+"""
+
+
+class Calls():
+    """Counts calls made from this process and from the forked workers"""
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.path.write_text("")
+
+    def add(self, kind, name):
+        line = f"{kind} {name}\n".encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def counts(self):
+        result = collections.Counter()
+        for line in self.path.read_text().splitlines():
+            kind, name = line.split(' ', 1)
+            result[kind] += 1
+            result[f"{kind} {name}"] += 1
+        return result
+
+
+def installer_tarball(platform):
+    script = (FAKE_INSTALLER % {'version': VERSION}).encode()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as tar:
+        info = tarfile.TarInfo("openshift-install")
+        info.size = len(script)
+        info.mode = 0o755
+        tar.addfile(info, io.BytesIO(script))
+    return f"openshift-install-{platform}-{VERSION}.tar.gz", gzip.compress(
+        buf.getvalue())
+
+
+class Server():
+    """The installer mirror and the Kubernetes API on a local port"""
+    def __init__(self, calls, platform):
+        self.calls = calls
+        self.tarball_name, self.tarball = installer_tarball(platform)
+        self.sha256 = hashlib.sha256(self.tarball).hexdigest()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+            def _send(self, code, body=b"", headers=None):
+                self.send_response(code)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.startswith("/ocp/"):
+                    server.mirror(self)
+                else:
+                    server.kube(self)
+
+            do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                     Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def mirror(self, request):
+        path = request.path[len("/ocp/"):]
+        if '/' not in path:
+            self.calls.add("mirror", "redirect")
+            request._send(301, headers={'Location': request.path + '/'})
+        elif path.endswith('/'):
+            self.calls.add("mirror", "listing")
+            if request.headers.get('If-None-Match') == '"bench"':
+                request._send(304)
+                return
+            request._send(
+                200, f'<a href="{self.tarball_name}">{self.tarball_name}</a>'
+                f'<a href="sha256sum.txt">sha256sum.txt</a>'.encode(),
+                {'ETag': '"bench"'})
+        elif path.endswith('/sha256sum.txt'):
+            self.calls.add("mirror", "checksum")
+            request._send(200,
+                          f"{self.sha256}  {self.tarball_name}\n".encode())
+        elif path.endswith(self.tarball_name):
+            self.calls.add("mirror", "tarball")
+            request._send(200, self.tarball)
+        else:
+            request._send(404)
+
+    def kube(self, request):
+        self.calls.add("kube", request.command)
+        length = int(request.headers.get('Content-Length') or 0)
+        if length:
+            request.rfile.read(length)
+        if request.path == "/readyz":
+            request._send(200, b"ok")
+            return
+        body = {'metadata': {'resourceVersion': '1'}}
+        if request.command == "GET" and request.path.endswith("machinesets"):
+            body = {'items': [{'metadata': {'name': 'worker'}}]}
+        request._send(200, json.dumps(body).encode(),
+                      {'Content-Type': 'application/json'})
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+class FakeRoute53():
+    """The route53 calls made by lib.route53 and lib.cleanup, the base
+    domain zone exists and is empty unless other zones and the records of
+    the zones by id are given"""
+    def __init__(self, calls, base_domain, zones=(), records=None):
+        self.calls = calls
+        self.zone = {
+            'Name': base_domain.rstrip('.') + '.',
+            'Id': '/hostedzone/BENCH'
+        }
+        self.zones = [self.zone] + list(zones)
+        self.records = records or {}
+
+    def list_hosted_zones_by_name(self, DNSName, **kwargs):  # pylint: disable=invalid-name
+        self.calls.add("route53", "list_hosted_zones_by_name")
+        zones = [zone for zone in self.zones if zone['Name'] == DNSName]
+        return {'HostedZones': zones, 'IsTruncated': False}
+
+    def change_resource_record_sets(self, **kwargs):
+        self.calls.add("route53", "change_resource_record_sets")
+        return {'ChangeInfo': {'Id': '/change/BENCH', 'Status': 'INSYNC'}}
+
+    def delete_hosted_zone(self, **kwargs):
+        self.calls.add("route53", "delete_hosted_zone")
+
+    def get_waiter(self, name):
+        calls = self.calls
+
+        class Waiter():
+            def wait(self, **kwargs):
+                calls.add("route53", f"waiter {name}")
+
+        return Waiter()
+
+    def get_paginator(self, name):
+        calls, zones, records = self.calls, self.zones, self.records
+
+        class Paginator():
+            def paginate(self, **kwargs):
+                calls.add("route53", name)
+                if name == 'list_hosted_zones':
+                    yield {'HostedZones': list(zones)}
+                else:
+                    yield {
+                        'ResourceRecordSets':
+                        list(records.get(kwargs['HostedZoneId'], []))
+                    }
+
+        return Paginator()
+
+
+def install(calls, server, base_domain, workdir):
+    """Points the orchestration to the stand-ins, done before the profile
+    workers are forked so they inherit it"""
+    route53.CLIENT_FACTORY = lambda: FakeRoute53(calls, base_domain)
+    neutron.FakeBackend.on_call = lambda cloud, name: calls.add(
+        "openstack", name)
+    acme = pathlib.Path(workdir) / "acme.sh"
+    acme.write_text(FAKE_ACME % {'calls': calls.path})
+    acme.chmod(0o755)
+    os.environ["ACME_SH"] = str(acme)
+    os.environ["FAKE_KUBECONFIG"] = KUBECONFIG % server.url
+    os.environ["FAKE_CALLS"] = str(calls.path)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Checks the startup of the lightweight commands stays within a budget
+
+Runs --help, --list-profiles and a typo in a profile name a few times each
+and fails if the median wall clock time or the time to import main is over
+budget, or if one of the heavy cloud libraries got imported at startup.
+
+  python bench/startup.py [--runs 10] [--budget-ms 300] [--import-budget-ms 100]
+"""
+import argparse
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+HEAVY = ("boto3", "botocore", "requests", "bs4", "openstack", "urllib3")
+
+
+def timed(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.monotonic()
+        subprocess.run(command,
+                       cwd=ROOT,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL,
+                       check=False)
+        timings.append((time.monotonic() - start) * 1000)
+    return statistics.median(timings)
+
+
+def import_time(runs):
+    """Returns the median cumulative time in ms python says importing main
+    takes"""
+    timings = []
+    for _ in range(runs):
+        ret = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                              "import main"],
+                             cwd=ROOT,
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE,
+                             text=True,
+                             check=True)
+        match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| main$",
+                          ret.stderr, re.M)
+        timings.append(int(match.group(1)) / 1000)
+    return statistics.median(timings)
+
+
+def heavy_imports():
+    ret = subprocess.run([
+        sys.executable, "-c", "import sys, main; print(' '.join("
+        "m for m in %r if m in sys.modules))" % (HEAVY, )
+    ],
+                         cwd=ROOT,
+                         stdout=subprocess.PIPE,
+                         text=True,
+                         check=True)
+    return ret.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=300)
+    parser.add_argument("--import-budget-ms", type=float, default=100)
+    parser.add_argument("--profiles", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml") as config:
+        for i in range(args.profiles):
+            config.write(f"""profile{i}:
+  clusterName: cluster{i}
+  baseDomain: example.com
+  osCloud: cloud
+  externalNetwork: public
+  installerVersion: 4.5.3
+  template: default
+""")
+        config.flush()
+        main_py = [sys.executable, "main.py", "--config-file", config.name]
+        commands = {
+            "--help": main_py + ["--help"],
+            "--list-profiles": main_py + ["--list-profiles"],
+            "unknown profile": main_py + ["nosuchprofile"],
+        }
+        failed = False
+        for name, command in commands.items():
+            elapsed = timed(command, args.runs)
+            over = elapsed > args.budget_ms
+            failed = failed or over
+            print(f"{'💥' if over else '✅'} {name:<16} {elapsed:7.1f}ms "
+                  f"(budget {args.budget_ms:.0f}ms)")
+
+    elapsed = import_time(args.runs)
+    over = elapsed > args.import_budget_ms
+    failed = failed or over
+    print(f"{'💥' if over else '✅'} {'import main':<16} {elapsed:7.1f}ms "
+          f"(budget {args.import_budget_ms:.0f}ms)")
+
+    heavy = heavy_imports()
+    if heavy:
+        failed = True
+        print(f"💥 heavy modules imported at startup: {', '.join(heavy)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Module deciding if a cluster install can start with the quota left
+
+The footprint of a cluster is estimated from its rendered install-config and
+compared with the project quota and usage, read once per cloud and cached for
+a little while. Admitted installs reserve their footprint until their
+servers had time to show up in the usage.
+"""
+import threading
+import time
+
+import yaml
+
+from lib import neutron
+
+RESOURCES = ('cores', 'ram', 'instances', 'floating_ips')
+
+
+def estimate(install_config, get_flavor, floating_ips=2):
+    """Returns the resources needed by a cluster from its install-config, the
+    control plane, the compute machines and the bootstrap server"""
+    config = yaml.safe_load(install_config)
+    platform = config.get('platform', {}).get('openstack', {})
+    default_flavor = platform.get('computeFlavor')
+
+    def flavor(pool):
+        pool_platform = (pool.get('platform') or {}).get('openstack') or {}
+        name = pool_platform.get('type') or default_flavor
+        if not name:
+            raise Exception("Cannot find the flavor of " +
+                            pool.get('name', 'machine pool'))
+        return get_flavor(name)
+
+    control_plane = config.get('controlPlane', {})
+    machines = [(flavor(control_plane), int(control_plane.get('replicas',
+                                                              3)) + 1)]
+    for pool in config.get('compute', []):
+        machines.append((flavor(pool), int(pool.get('replicas', 3))))
+
+    return {
+        'cores': sum(f['vcpus'] * count for f, count in machines),
+        'ram': sum(f['ram'] * count for f, count in machines),
+        'instances': sum(count for _, count in machines),
+        'floating_ips': floating_ips,
+    }
+
+
+class AdmissionController():
+    """backends is a dict of osCloud to the openstackBackend to use for it"""
+    def __init__(self, ttl=30, reservation_ttl=900, backends=None):
+        self.ttl = ttl
+        self.reservation_ttl = reservation_ttl
+        self.backends = backends or {}
+        self._usage = {}
+        self._flavors = {}
+        self._reservations = {}
+        self._lock = threading.RLock()
+
+    def usage(self, os_cloud):
+        """Returns the quota usage of a cloud, cached for ttl seconds"""
+        with self._lock:
+            cached = self._usage.get(os_cloud)
+            if cached is None or time.monotonic() - cached[0] > self.ttl:
+                cached = (time.monotonic(),
+                          neutron.get_backend(
+                              os_cloud,
+                              self.backends.get(os_cloud)).get_quota_usage())
+                self._usage[os_cloud] = cached
+            return cached[1]
+
+    def flavor(self, os_cloud, name):
+        with self._lock:
+            if (os_cloud, name) not in self._flavors:
+                self._flavors[(os_cloud, name)] = neutron.get_backend(
+                    os_cloud, self.backends.get(os_cloud)).get_flavor(name)
+            return self._flavors[(os_cloud, name)]
+
+    def footprint(self, os_cloud, install_config, floating_ips=2):
+        return estimate(install_config, lambda name: self.flavor(
+            os_cloud, name), floating_ips)
+
+    def _reserved(self, os_cloud):
+        now = time.monotonic()
+        result = dict.fromkeys(RESOURCES, 0)
+        for cloud, footprint, when in self._reservations.values():
+            if cloud == os_cloud and now - when < self.reservation_ttl:
+                for resource in RESOURCES:
+                    result[resource] += footprint[resource]
+        return result
+
+    def admit(self, name, os_cloud, footprint, credit=None):
+        """Reserves the footprint and returns True if it fits in what is left
+        of the quota, False if it has to wait. Raises an exception if it
+        would not fit even in an empty project.
+
+        credit are the resources used now which the install frees before
+        creating its own, ie: the cluster it reinstalls."""
+        with self._lock:
+            usage = self.usage(os_cloud)
+            reserved = self._reserved(os_cloud)
+            credit = credit or {}
+            for resource in RESOURCES:
+                limit = usage[resource]['limit']
+                if limit < 0:
+                    continue
+                if footprint[resource] > limit:
+                    raise Exception(
+                        f"{name} needs {footprint[resource]} {resource} but "
+                        f"the quota of {os_cloud} is {limit}")
+                used = max(usage[resource]['used'] - credit.get(resource, 0),
+                           0)
+                if used + reserved[resource] + footprint[resource] > limit:
+                    return False
+            self._reservations[name] = (os_cloud, footprint,
+                                        time.monotonic())
+            return True
+
+    def release(self, name):
+        """Drops the reservation of a finished install and forgets the usage
+        of its cloud since it just changed"""
+        with self._lock:
+            reservation = self._reservations.pop(name, None)
+            if reservation:
+                self._usage.pop(reservation[0], None)
@@ -0,0 +1,144 @@
+"""Module keeping the letsencrypt certificates of the clusters across rebuilds
+
+Certificates are stored in certs/<cluster>.<domain>/ with an index of their
+names and expiry date in certs/index.json, a cluster reinstalled under the
+same name reuses its certificate as long as it has enough lifetime left
+instead of asking acme.sh for a new one and hitting the rate limits.
+"""
+import json
+import os
+import pathlib
+import ssl
+import subprocess
+import time
+
+from lib import postinstall, utils
+
+ACME = os.path.expanduser("~/.acme.sh/acme.sh")
+MIN_LIFETIME = 30 * 24 * 3600
+
+
+def acme_path():
+    """Returns where acme.sh is, ACME_SH overrides it"""
+    return os.environ.get("ACME_SH", ACME)
+
+
+def available():
+    return os.path.exists(acme_path())
+
+
+def router_domains(cluster_name, base_domain):
+    """Returns the api and the wildcard apps names of a cluster"""
+    return [
+        f"api.{cluster_name}.{base_domain}",
+        f"*.apps.{cluster_name}.{base_domain}"
+    ]
+
+
+def not_after(path):
+    """Returns the expiry of a PEM certificate as a timestamp"""
+    output = subprocess.run(
+        ["openssl", "x509", "-noout", "-enddate", "-in",
+         str(path)],
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True).stdout
+    return ssl.cert_time_to_seconds(output.strip().split('=', 1)[1])
+
+
+def _acme(*args):
+    ret = subprocess.run([acme_path(), *args],
+                         stdout=subprocess.PIPE,
+                         stderr=subprocess.STDOUT,
+                         text=True,
+                         check=False)
+    # 2 is acme.sh telling the cert is still valid and was kept
+    if ret.returncode not in (0, 2):
+        output = ret.stdout.strip().splitlines() or [ret.returncode]
+        raise Exception(f"acme.sh {args[0]} failed: {output[-1]}")
+
+
+class CertStore():
+    def __init__(self, root="certs", min_lifetime=MIN_LIFETIME):
+        self.root = pathlib.Path(root)
+        self.min_lifetime = min_lifetime
+        self.index_path = self.root / "index.json"
+
+    def _index(self):
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _record(self, name, entry):
+        with utils.locked(self.root / ".index.lock"):
+            index = self._index()
+            index[name] = entry
+            utils.write_atomic(self.index_path,
+                               json.dumps(index, indent=2, sort_keys=True))
+
+    def lookup(self, cluster_name, base_domain):
+        """Returns the fullchain and key of the stored certificate if it is
+        still valid for long enough, None otherwise"""
+        name = f"{cluster_name}.{base_domain}"
+        entry = self._index().get(name)
+        directory = self.root / name
+        paths = (directory / "fullchain.pem", directory / "key.pem")
+        if (not entry or entry['domains'] != router_domains(
+                cluster_name, base_domain)
+                or entry['not_after'] - time.time() < self.min_lifetime
+                or not all(path.exists() for path in paths)):
+            return None
+        return paths
+
+    def issue(self, cluster_name, base_domain):
+        """Issues a certificate with acme.sh and stores it"""
+        name = f"{cluster_name}.{base_domain}"
+        domains = router_domains(cluster_name, base_domain)
+        directory = self.root / name
+        directory.mkdir(parents=True, exist_ok=True, mode=0o700)
+        names = [arg for domain in domains for arg in ("-d", domain)]
+        _acme("--issue", *names, "--dns", "dns_aws")
+        _acme("--install-cert", *names, "--cert-file",
+              str(directory / "cert.pem"), "--key-file",
+              str(directory / "key.pem"), "--fullchain-file",
+              str(directory / "fullchain.pem"), "--ca-file",
+              str(directory / "ca.cer"))
+        self._record(
+            name, {
+                'domains': domains,
+                'not_after': not_after(directory / "fullchain.pem"),
+                'issued': time.time(),
+            })
+        return directory / "fullchain.pem", directory / "key.pem"
+
+    def get(self, cluster_name, base_domain):
+        """Returns the fullchain and key of a cluster, issuing a new
+        certificate only when the stored one is missing or expires soon"""
+        name = f"{cluster_name}.{base_domain}"
+        (self.root / name).mkdir(parents=True, exist_ok=True, mode=0o700)
+        with utils.locked(self.root / name / ".lock"):
+            return self.lookup(cluster_name, base_domain) or self.issue(
+                cluster_name, base_domain)
+
+    def prepare(self, cluster_name, base_domain):
+        """Gets the certificate in the background, ie: while the cluster is
+        installing, returns a future of get()"""
+        return utils.in_thread(self.get, cluster_name, base_domain)
+
+    def write_manifests(self, install_dir, cluster_name, base_domain):
+        """Adds the stored certificate to the manifests of install_dir so the
+        cluster is installed with it, returns False when there is no stored
+        certificate to use"""
+        paths = self.lookup(cluster_name, base_domain)
+        if not paths:
+            return False
+        postinstall.write_router_certs_manifests(install_dir, *paths)
+        return True
+
+    def push(self, client, cluster_name, base_domain, certs=None):
+        """Pushes the certificate as the router TLS secret of the cluster,
+        certs is the future returned by prepare() if there is one"""
+        fullchain, key = certs.result() if certs else self.get(
+            cluster_name, base_domain)
+        postinstall.install_router_certs(client, fullchain, key)
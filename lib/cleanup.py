@@ -14,9 +14,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 #
-# Python script using the boto library to delete route53 zones and records,
-# cause the awscli seems too sucky with deletion (you need to pass a big xml
-# blob to it)
+# Python script using boto3 to delete route53 zones and records, cause the
+# awscli seems too sucky with deletion (you need to pass a big xml blob to it)
 #
 # You need the credentials setup with whatever means in ~/.aws or via env
 # variables.
@@ -25,92 +24,131 @@
 # forget to delete some A records, so the reinstall fails :((
 # let's be helpful and do it for the reaper....
 #
+from lib import route53
 
-import argparse
-import sys
-import os
-
-import boto
+# Route53 accepts up to 1000 values and 32000 characters of values per change
+# batch
+MAX_BATCH_VALUES = 1000
+MAX_BATCH_CHARACTERS = 32000
 
 
 class NoGoZoneIsANogo(Exception):
     pass
 
 
-def delete_hosted_zone(route53, zonename, silent):
-    zone = route53.get_zone(zonename)
-    if not zone:
+def _normalize(name):
+    return name.replace('\\052', '*').rstrip('.').lower() + '.'
+
+
+def list_record_sets(zone_id, start=None):
+    """Yields the record sets of a zone, starting from the start name if
+    specified, route53 returns them sorted by reversed labels so all the
+    records below a name are listed one after the other."""
+    paginator = route53._get_connection().get_paginator(
+        'list_resource_record_sets')
+    kwargs = {'HostedZoneId': zone_id}
+    if start:
+        kwargs['StartRecordName'] = start
+    for page in paginator.paginate(**kwargs):
+        yield from page['ResourceRecordSets']
+
+
+def _chunks(records):
+    chunk, values, characters = [], 0, 0
+    for record in records:
+        rvalues = [
+            v['Value'] for v in record.get('ResourceRecords', [])
+        ] or [record.get('AliasTarget', {}).get('DNSName', '')]
+        rcharacters = sum(len(v) for v in rvalues)
+        if chunk and (values + len(rvalues) > MAX_BATCH_VALUES
+                      or characters + rcharacters > MAX_BATCH_CHARACTERS):
+            yield chunk
+            chunk, values, characters = [], 0, 0
+        chunk.append(record)
+        values += len(rvalues)
+        characters += rcharacters
+    if chunk:
+        yield chunk
+
+
+def delete_record_sets(zone_id, records):
+    """Delete records in as few change batches as route53 allows"""
+    for chunk in _chunks(records):
+        route53._get_connection().change_resource_record_sets(
+            HostedZoneId=zone_id,
+            ChangeBatch={
+                'Changes': [{
+                    'Action': 'DELETE',
+                    'ResourceRecordSet': record
+                } for record in chunk]
+            })
+
+
+def delete_zone(zone_id):
+    """Delete a hosted zone with all its records, returns the records
+    deleted"""
+    records = [
+        rec for rec in list_record_sets(zone_id)
+        if rec['Type'] not in ('NS', 'SOA')
+    ]
+    delete_record_sets(zone_id, records)
+    route53._get_connection().delete_hosted_zone(Id=zone_id)
+    return records
+
+
+def delete_hosted_zone(zonename, silent):
+    zone_ids = route53.find_zone_ids(zonename)
+    if not zone_ids:
         if not silent:
             print("Could not find " + zonename)
         return
-    records = zone.get_records()
 
-    if not silent:
-        print("Deleting zone: " + zonename)
-    for rec in records:
-        if rec.type in ('NS', 'SOA'):
-            continue
-        zone.delete_record(rec)
+    for zone_id in zone_ids:
         if not silent:
-            print("\tdeleted record " + rec.name)
-
-    if not silent:
-        print("Zone " + zonename + " has been deleted.")
-    zone.delete()
-
-
-def delete_record(route53, zonename, recordname, silent):
-    if not zonename.endswith("."):
-        zonename += "."
-    if not recordname.endswith("."):
-        recordname += "."
-
-    zone = route53.get_zone(zonename)
-    if not zone:
-        raise NoGoZoneIsANogo("Could not find zone for " + zonename)
-
-    record = zone.get_a(recordname)
-    if not record:
+            print("Deleting zone: " + zonename)
+        records = delete_zone(zone_id)
+        if not silent:
+            for rec in records:
+                print("\tdeleted record " + rec['Name'])
+            print("Zone " + zonename + " has been deleted.")
+
+
+def delete_records(zonename, parent, recordnames, silent):
+    """Delete the A records called recordnames, they all need to be below
+    parent so we only have to list from there"""
+    try:
+        zone_id = route53.get_zone_id(zonename)
+    except Exception as exception:
+        raise NoGoZoneIsANogo("Could not find zone for " +
+                              zonename) from exception
+
+    parent = _normalize(parent)
+    recordnames = [_normalize(name) for name in recordnames]
+    records = []
+    for rec in list_record_sets(zone_id, start=parent):
+        name = _normalize(rec['Name'])
+        if name != parent and not name.endswith('.' + parent):
+            break
+        if rec['Type'] == 'A' and name in recordnames:
+            records.append(rec)
+
+    if not records:
         if not silent:
-            print("Could not find record " + recordname)
+            print("Could not find records " + ", ".join(recordnames))
         return
 
+    delete_record_sets(zone_id, records)
     if not silent:
-        print("Record " + record.name + " has been deleted.")
-    zone.delete_a(record.name)
-
-
-def check_for_credential_file():
-    if 'AWS_SHARED_CREDENTIALS_FILE' not in os.environ:
-        return (None, None)
-    path = os.environ['AWS_SHARED_CREDENTIALS_FILE']
-    path = os.path.expanduser(path)
-    path = os.path.expandvars(path)
-    aws_access_key_id = None
-    aws_secret_access_key = None
-
-    if os.path.isfile(path):
-        fp = open(path)
-        lines = fp.readlines()
-        fp.close()
-        for line in lines:
-            if line[0] != '#':
-                if '=' in line:
-                    name, value = line.split('=', 1)
-                    if name.strip() == 'aws_access_key_id':
-                        value = value.strip()
-                        aws_access_key_id = value
-                    elif name.strip() == 'aws_secret_access_key':
-                        value = value.strip()
-                        aws_secret_access_key = value
-    return (aws_access_key_id, aws_secret_access_key)
-
-
-def cleanup_dns_names(clustername, base_domain, silent=False):
-    zonename = clustername + '.' + base_domain
-    aws_access_key_id, aws_secret_access_key = check_for_credential_file()
-    route53 = boto.connect_route53(aws_access_key_id, aws_secret_access_key)
+        for rec in records:
+            print("Record " + rec['Name'] + " has been deleted.")
 
-    delete_hosted_zone(route53, zonename, silent)
-    delete_record(route53, base_domain, "api." + zonename, silent)
-    delete_record(route53, base_domain, "\\052.apps." + zonename, silent)
+
+def cleanup_dns_names(clustername, base_domain, silent=False, records=True):
+    """Delete the cluster hosted zone and, unless records is False, the api
+    and *.apps records in the base domain zone"""
+    zonename = clustername + '.' + base_domain
+    delete_hosted_zone(zonename, silent)
+    if not records:
+        return
+    delete_records(base_domain, zonename,
+                   ["api." + zonename, "*.apps." + zonename], silent)
@@ -1,19 +1,27 @@
 """Module responsible for download of openshift-install binary"""
 from shutil import copyfileobj
 from sys import platform
-from tempfile import NamedTemporaryFile
 from pathlib import Path
 from typing import Tuple, Optional
 
+import concurrent.futures
+import hashlib
+import json
 import logging
+import os
+import random
 import re
 import stat
 import tarfile
+import threading
 import time
 import requests
+import urllib3
 
 from bs4 import BeautifulSoup
 
+from lib import utils
+
 PROD_ROOT = "http://mirror.openshift.com/pub/openshift-v4/clients/ocp/"
 BUILD_ROOT = "https://openshift-release-artifacts.svc.ci.openshift.org/"
 PREVIEW_ROOT = "http://mirror.openshift.com/pub/openshift-v4/clients/ocp-dev-preview/"
@@ -23,6 +31,34 @@ VERSION_RE = re.compile(
 EXTRACTION_RE = re.compile(
     r'.*Extracting tools for .*, may take up to a minute.*')
 
+# how long in seconds a resolved version alias is trusted before asking the
+# mirror again
+INDEX_TTL = 3600
+INDEX_FILE = "index.json"
+CHUNK_SIZE = 1024 * 1024
+# how long in seconds to wait for a devel release to be extracted, and the
+# bounds of the delay between two checks
+DEVEL_TIMEOUT = 1800
+DEVEL_POLL_MIN = 2
+DEVEL_POLL_MAX = 60
+# how long in seconds to wait for the mirror to answer a listing or a
+# checksum
+REQUEST_TIMEOUT = 30
+
+SESSION = requests.Session()
+_INDEX_LOCK = threading.Lock()
+_POLLERS = {}
+_POLLERS_LOCK = threading.Lock()
+
+
+def _new_session():
+    global SESSION  # pylint: disable=global-statement
+    SESSION = requests.Session()
+
+
+# pooled connections must not be shared with forked workers
+os.register_at_fork(after_in_child=_new_session)
+
 
 def _current_platform():
     if platform == "linux":
@@ -32,37 +68,202 @@ def _current_platform():
     raise Exception(f"Unrecognized platform {platform}")
 
 
-def get_url(directory: str) -> Tuple[Optional[str], Optional[str]]:
-    """Searches the http directory and returns both url to installer
-    and version.
-    """
-    lst = requests.get(directory, allow_redirects=True)
+def _parse_listing(lst: requests.Response
+                   ) -> Tuple[Optional[str], Optional[str]]:
     tree = BeautifulSoup(lst.content, 'html.parser')
     links = tree.find_all('a')
     installer, version = None, None
     for k in links:
-        match = VERSION_RE.match(k.get('href'))
+        match = VERSION_RE.match(k.get('href') or '')
         if match and match.group('platform') == _current_platform():
             installer = lst.url + k.get('href')
             version = match.group('version')
     return installer, version
 
 
-def get_devel_url(version: str) -> str:
-    """
-    Searches developement sources and returns url to installer
+def get_url(directory: str) -> Tuple[Optional[str], Optional[str]]:
+    """Searches the http directory and returns both url to installer
+    and version.
     """
-    req = requests.get(BUILD_ROOT + version, allow_redirects=True)
-    ast = BeautifulSoup(req.content, 'html.parser')
+    return _parse_listing(
+        SESSION.get(directory, allow_redirects=True, timeout=REQUEST_TIMEOUT))
+
+
+def get_checksum(installer_url: str) -> Optional[str]:
+    """Returns the sha256 of the installer tarball from the sha256sum.txt
+    published next to it"""
+    directory, filename = installer_url.rsplit('/', 1)
+    req = SESSION.get(directory + '/sha256sum.txt',
+                      allow_redirects=True,
+                      timeout=REQUEST_TIMEOUT)
+    if req.status_code != 200:
+        return None
+    for line in req.text.splitlines():
+        fields = line.split()
+        if len(fields) == 2 and fields[1].lstrip('*') == filename:
+            return fields[0]
+    return None
+
+
+def _poll_devel(version: str, timeout: float) -> requests.Response:
+    deadline = time.monotonic() + timeout
+    delay = DEVEL_POLL_MIN
+    headers = {}
     logging.info('Checking stage repository for installer')
-    while len(ast.find_all('p')) != 0 and EXTRACTION_RE.match(
-            next(ast.find_all('p')[0].children)):
-        logging.debug('The installer was not extracted yet, waiting for 10s')
-        time.sleep(10)
-        req = requests.get(BUILD_ROOT + version, allow_redirects=True)
-        ast = BeautifulSoup(req.content, 'html.parser')
-    logging.debug('Installer found on page, continuing')
-    return get_url(req.url)
+    while True:
+        req = SESSION.get(BUILD_ROOT + version,
+                          headers=headers,
+                          allow_redirects=True,
+                          timeout=30)
+        if req.status_code != 304:
+            req.raise_for_status()
+            # a substring search is enough, no need to parse the page
+            if not EXTRACTION_RE.search(req.text):
+                logging.debug('Installer found on page, continuing')
+                return req
+            headers = {}
+            if req.headers.get('ETag'):
+                headers['If-None-Match'] = req.headers['ETag']
+            if req.headers.get('Last-Modified'):
+                headers['If-Modified-Since'] = req.headers['Last-Modified']
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise Exception(f"Timed out after {timeout}s waiting for the "
+                            f"installer of {version} to be extracted")
+        # exponential backoff with jitter so parallel runs don't poll
+        # in lockstep
+        wait = min(remaining, delay * random.uniform(0.5, 1.0))
+        logging.debug('The installer was not extracted yet, waiting for %ds',
+                      wait)
+        time.sleep(wait)
+        delay = min(delay * 2, DEVEL_POLL_MAX)
+
+
+def get_devel_url(version: str,
+                  timeout: float = DEVEL_TIMEOUT
+                  ) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Searches developement sources and returns url to installer, waiting up
+    to timeout seconds for the release to be extracted. Threads waiting for
+    the same version share a single poller.
+    """
+    with _POLLERS_LOCK:
+        poller = _POLLERS.get(version)
+        owner = poller is None
+        if owner:
+            poller = _POLLERS[version] = concurrent.futures.Future()
+    if not owner:
+        return poller.result()
+
+    try:
+        result = _parse_listing(_poll_devel(version, timeout))
+        poller.set_result(result)
+    except Exception as exception:
+        poller.set_exception(exception)
+        raise
+    finally:
+        with _POLLERS_LOCK:
+            del _POLLERS[version]
+    return result
+
+
+SOURCES = {
+    "prod": PROD_ROOT,
+    "prev": PREVIEW_ROOT,
+}
+
+
+def _load_index(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(path: Path, key: str, entry: dict):
+    with _INDEX_LOCK:
+        index = _load_index(path)
+        index[key] = entry
+        utils.write_atomic(path, json.dumps(index, indent=2, sort_keys=True))
+
+
+def resolve(installer_version: str,
+            index_path: Path,
+            source: str = "prod",
+            ttl: int = INDEX_TTL,
+            offline: bool = False,
+            devel_timeout: float = DEVEL_TIMEOUT) -> dict:
+    """Resolves a version, or an alias like latest-4.5, of a channel to the
+    concrete version, url and checksum of the installer.
+
+    Resolutions are kept in an index file and reused while younger than ttl,
+    after that the mirror is asked again with a conditional request. When
+    offline only the index is used.
+    """
+    key = f"{source}:{installer_version}"
+    entry = _load_index(index_path).get(key)
+    if entry and (offline or time.time() - entry['resolved'] < ttl):
+        return entry
+    if offline:
+        raise Exception(f"Cannot resolve {key} offline, it is not in the "
+                        f"index {index_path}")
+
+    if source != "devel":
+        return _resolve(key, installer_version, index_path, source, entry)
+
+    # only one process polls the release server for a version, the other
+    # ones wait for it and pick its result from the index
+    lock = index_path.parent.joinpath(f".devel-{installer_version}.lock")
+    with utils.locked(lock):
+        entry = _load_index(index_path).get(key)
+        if entry and time.time() - entry['resolved'] < ttl:
+            return entry
+        return _resolve(key, installer_version, index_path, source, entry,
+                        devel_timeout)
+
+
+def _resolve(key: str,
+             installer_version: str,
+             index_path: Path,
+             source: str,
+             entry: Optional[dict],
+             devel_timeout: float = DEVEL_TIMEOUT) -> dict:
+    if source == "devel":
+        url, version = get_devel_url(installer_version, devel_timeout)
+        headers = {}
+    elif source in SOURCES:
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        lst = SESSION.get(SOURCES[source] + installer_version,
+                          headers=headers,
+                          allow_redirects=True,
+                          timeout=REQUEST_TIMEOUT)
+        if lst.status_code == 304 and entry:
+            logging.debug('Mirror listing for %s has not changed', key)
+            entry['resolved'] = time.time()
+            _save_index(index_path, key, entry)
+            return entry
+        lst.raise_for_status()
+        url, version = _parse_listing(lst)
+        headers = lst.headers
+    else:
+        raise Exception("Error for source profile " + source)
+
+    if url is None:
+        raise Exception(f"Could not find an installer for {key}")
+    entry = {
+        'version': version,
+        'url': url,
+        'sha256': get_checksum(url),
+        'resolved': time.time(),
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+    }
+    _save_index(index_path, key, entry)
+    return entry
 
 
 def get_prev_url(version):
@@ -78,40 +279,112 @@ def get_prod_url(version):
 def _get_storage_path(version: str, install_base: str) -> str:
     path = Path(install_base)
     spec_path = path.joinpath(version)
-    if not spec_path.exists():
-        spec_path.mkdir()
+    spec_path.mkdir(parents=True, exist_ok=True)
     return spec_path.as_posix()
 
 
-def _extract_tar(buffer: NamedTemporaryFile, target: str) -> Path:
-    result = None
-    with tarfile.open(buffer.name) as tar:
-        inst_info = None
-        for i in tar.getmembers():
-            if i.name == 'openshift-install':
-                inst_info = i
-        if inst_info is None:
-            raise Exception("error")
-        stream = tar.extractfile(inst_info)
-        result = Path(target).joinpath('openshift-install')
-        with result.open('wb') as output:
-            copyfileobj(stream, output)
-        result.chmod(result.stat().st_mode | stat.S_IXUSR)
-    return result
+class _ResumableStream():
+    """File like object over the body of an http download, when the
+    connection breaks the download is resumed where it stopped with a Range
+    request. Everything read goes through a sha256."""
+    def __init__(self, url: str, retries: int = 5):
+        self.url = url
+        self.retries = retries
+        self.offset = 0
+        self.total = None
+        self.validator = None
+        self.sha256 = hashlib.sha256()
+        self.response = None
+        self._open()
+
+    def _open(self):
+        headers = {}
+        if self.offset:
+            headers['Range'] = f"bytes={self.offset}-"
+            if self.validator:
+                headers['If-Range'] = self.validator
+        self.response = SESSION.get(self.url,
+                                    headers=headers,
+                                    stream=True,
+                                    allow_redirects=True,
+                                    timeout=60)
+        self.response.raise_for_status()
+        if self.offset:
+            if self.response.status_code != 206:
+                raise Exception(f"Cannot resume download of {self.url}")
+            return
+        self.validator = (self.response.headers.get('ETag')
+                          or self.response.headers.get('Last-Modified'))
+        if 'Content-Length' in self.response.headers:
+            self.total = int(self.response.headers['Content-Length'])
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(CHUNK_SIZE), b''))
+        retries = self.retries
+        while True:
+            try:
+                data = self.response.raw.read(size, decode_content=False)
+                if data or self.total is None or self.offset >= self.total:
+                    break
+                raise IOError(f"Connection closed after {self.offset} bytes")
+            except (IOError, requests.RequestException,
+                    urllib3.exceptions.HTTPError) as exception:
+                if retries == 0:
+                    raise
+                retries -= 1
+                logging.info('Download interrupted (%s), resuming from %d',
+                             exception, self.offset)
+                self.response.close()
+                self._open()
+        self.offset += len(data)
+        self.sha256.update(data)
+        return data
 
+    def drain(self):
+        """Read the rest of the download without keeping it"""
+        while self.read(CHUNK_SIZE):
+            pass
 
-def get_installer(tar_url: str, target: str) -> str:
-    """Download and extract the installer into the target"""
-    result = None
+    def close(self):
+        self.response.close()
+
+
+def get_installer(tar_url: str, target: str, sha256: str = None) -> str:
+    """Download and extract the installer into the target, the archive is
+    decompressed while it is downloaded and never written to disk. The
+    installer is written under a temporary name and renamed once the
+    checksum has been verified so nobody sees a half written binary."""
     logging.info('Starting the download of installer')
-    req = requests.get(tar_url, stream=True, allow_redirects=True)
-    buf = NamedTemporaryFile()
-    for block in req.iter_content(chunk_size=4096):
-        buf.write(block)
-    buf.flush()
-    logging.debug('Download finished, starting extraction')
-    result = _extract_tar(buf, target)
-    buf.close()
+    result = Path(target).joinpath('openshift-install')
+    tmp = Path(target).joinpath(f".openshift-install.{os.getpid()}")
+    stream = _ResumableStream(tar_url)
+    try:
+        with tarfile.open(fileobj=stream, mode='r|gz',
+                          bufsize=CHUNK_SIZE) as tar:
+            for member in tar:
+                if member.name in ('openshift-install',
+                                   './openshift-install'):
+                    with tar.extractfile(member) as source, tmp.open(
+                            'wb') as output:
+                        copyfileobj(source, output, CHUNK_SIZE)
+                    break
+            else:
+                raise Exception(f"Could not find openshift-install in "
+                                f"{tar_url}")
+        if sha256:
+            logging.debug('Extraction finished, verifying checksum')
+            stream.drain()
+            if stream.sha256.hexdigest() != sha256:
+                raise Exception(f"Checksum mismatch for {tar_url}: got "
+                                f"{stream.sha256.hexdigest()} expected "
+                                f"{sha256}")
+        tmp.chmod(tmp.stat().st_mode | stat.S_IXUSR)
+        tmp.replace(result)
+    finally:
+        stream.close()
+        if tmp.exists():
+            tmp.unlink()
 
     logging.info('Installer extracted to %s', result.as_posix())
     return result.as_posix()
@@ -119,27 +392,49 @@ def get_installer(tar_url: str, target: str) -> str:
 
 def download_installer(installer_version: str,
                        dest_directory: str,
-                       source: str = "prod") -> str:
+                       source: str = "prod",
+                       offline: bool = False,
+                       ttl: int = INDEX_TTL,
+                       devel_timeout: float = DEVEL_TIMEOUT) -> str:
     """Starts search and extraction of installer"""
     logging.debug(
         "Getting version %s, storing to directory %s and devel is %r",
         installer_version, dest_directory, source)
 
-    downloader = None
-    if source == "prod":
-        downloader = get_prod_url
-    elif source == "prev":
-        downloader = get_prev_url
-    elif source == "devel":
-        downloader = get_devel_url
-    else:
-        raise Exception("Error for source profile " + source)
+    # a concrete version already downloaded doesn't need to be resolved
+    cached = Path(dest_directory).joinpath(installer_version,
+                                           'openshift-install')
+    if cached.exists():
+        logging.info('Found installer at %s', cached.parent.as_posix())
+        return cached.as_posix()
+
+    entry = resolve(installer_version,
+                    Path(dest_directory).joinpath(INDEX_FILE),
+                    source=source,
+                    ttl=ttl,
+                    offline=offline,
+                    devel_timeout=devel_timeout)
+    return fetch(entry, dest_directory, offline)[0]
 
-    url, version = downloader(installer_version)
-    root = Path(dest_directory).joinpath(version)
 
-    if root.exists() and root.joinpath('openshift-install').exists():
+def fetch(entry: dict, dest_directory: str,
+          offline: bool = False) -> Tuple[str, bool]:
+    """Download the installer of a resolved entry unless it is there
+    already, returns its path and whether it was downloaded. Only one thread
+    or process downloads a given version at a time, the others wait for it
+    and use its result."""
+    root = Path(dest_directory).joinpath(entry['version'])
+    binary = root.joinpath('openshift-install')
+    if binary.exists():
         logging.info('Found installer at %s', root.as_posix())
-        return root.joinpath('openshift-install').as_posix()
-    root.mkdir(parents=True)
-    return get_installer(url, root.as_posix())
+        return binary.as_posix(), False
+    if offline:
+        raise Exception(f"Cannot download {entry['version']} offline")
+
+    with utils.locked(Path(dest_directory).joinpath(f".{entry['version']}.lock")):
+        if binary.exists():
+            logging.info('Found installer at %s', root.as_posix())
+            return binary.as_posix(), False
+        root.mkdir(parents=True, exist_ok=True)
+        return get_installer(entry['url'], root.as_posix(),
+                             entry.get('sha256')), True
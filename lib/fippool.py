@@ -0,0 +1,146 @@
+"""Module keeping a warm pool of floating ips reused across reinstalls
+
+Floating ips of the pool are tagged with the external network they belong to,
+free ones carry an extra tag and leased ones the tag of the cluster using
+them. A floating ip remembers the cluster and role it was last leased to, so
+a reinstalled cluster gets the same addresses back and its DNS records don't
+have to change. The pool is trimmed back to its size when clusters are only
+uninstalled or swept.
+"""
+import pathlib
+import threading
+
+from lib import neutron, utils
+
+FREE_TAG = "moumoustall-free"
+ROLES = ("api", "apps")
+
+
+def pool_tag(network):
+    return f"moumoustall-pool={network}"
+
+
+def role_tag(cluster_name, role):
+    return f"moumoustall-role={cluster_name}:{role}"
+
+
+def is_pooled(fip):
+    return any(tag.startswith("moumoustall-pool=") for tag in fip['tags'])
+
+
+def release(backend, fip):
+    """Returns a leased floating ip to the pool, keeping the role it had so
+    the same cluster can get it back"""
+    tags = [
+        tag for tag in fip['tags']
+        if tag.startswith("moumoustall-pool=")
+        or tag.startswith("moumoustall-role=")
+    ] + [FREE_TAG]
+    if fip.get('port_id'):
+        backend.unset_floating_ip_port(fip['floating_ip_address'])
+    backend.update_floating_ip(fip['floating_ip_address'],
+                               description="moumoustall pool",
+                               tags=tags)
+
+
+class FloatingIPPool():
+    def __init__(self,
+                 os_cloud,
+                 network,
+                 size,
+                 backend=None,
+                 lockdir="installs"):
+        self.os_cloud = os_cloud
+        self.network = network
+        self.size = size
+        self.backend = neutron.get_backend(os_cloud, backend)
+        self.lockfile = pathlib.Path(
+            lockdir) / f".fippool-{os_cloud}-{network}.lock"
+        self._stop = threading.Event()
+
+    def free(self):
+        return [
+            fip for fip in self.backend.list_floating_ips(
+                tags=[pool_tag(self.network), FREE_TAG])
+            if not fip.get('port_id')
+        ]
+
+    def lease(self, cluster_name, base_domain):
+        """Returns a dict of role to floating ip address for cluster_name,
+        preferring the floating ips the cluster had before and allocating
+        new ones when the pool is empty"""
+        descriptions = neutron.descriptions(cluster_name, base_domain)
+        result = {}
+        with utils.locked(self.lockfile):
+            free = self.free()
+            for role in ROLES:
+                tag = role_tag(cluster_name, role)
+                fip = next((f for f in free if tag in f['tags']), None)
+                if fip is None:
+                    fip = next((f for f in free if not any(
+                        t.startswith("moumoustall-role=") for t in f['tags'])),
+                               None)
+                if fip is None:
+                    fip = next(iter(free), None)
+                tags = [
+                    pool_tag(self.network),
+                    neutron.cluster_tag(cluster_name), tag
+                ]
+                if fip is None:
+                    fip = self.backend.create_floating_ip(
+                        self.network, descriptions[role], tags)
+                else:
+                    free.remove(fip)
+                    self.backend.update_floating_ip(
+                        fip['floating_ip_address'],
+                        description=descriptions[role],
+                        tags=tags)
+                result[role] = fip['floating_ip_address']
+        return result
+
+    def replenish(self):
+        """Allocate floating ips until the pool has size free ones, returns
+        how many were allocated"""
+        with utils.locked(self.lockfile):
+            missing = self.size - len(self.free())
+            for _ in range(missing):
+                self.backend.create_floating_ip(
+                    self.network, "moumoustall pool",
+                    [pool_tag(self.network), FREE_TAG])
+        return max(missing, 0)
+
+    def trim(self):
+        """Delete the free floating ips beyond size, the ones remembering the
+        cluster they were leased to are kept first, returns their
+        addresses"""
+        deleted = []
+        with utils.locked(self.lockfile):
+            free = sorted(self.free(),
+                          key=lambda fip: any(
+                              t.startswith("moumoustall-role=")
+                              for t in fip['tags']))
+            for fip in free[:max(len(free) - self.size, 0)]:
+                self.backend.delete_floating_ip(fip['floating_ip_address'])
+                deleted.append(fip['floating_ip_address'])
+        return deleted
+
+    def _replenisher(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.replenish()
+            except Exception as exception:  # pylint: disable=broad-except
+                print(f"🎱 Could not replenish floating ip pool: {exception}")
+            self._stop.wait(interval)
+
+    def start_replenisher(self, interval=300):
+        """Refill the pool in a background thread every interval seconds
+        until stop_replenisher is called"""
+        self._stop.clear()
+        thread = threading.Thread(target=self._replenisher,
+                                  args=(interval, ),
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def stop_replenisher(self):
+        self._stop.set()
@@ -0,0 +1,114 @@
+"""Module checking the health of the installed clusters
+
+Every cluster is probed at the same time, its API readiness, the DNS names
+and its floating ips, each probe with its own timeout. Results are cached in
+installs/.status-cache.json for a little while.
+"""
+import json
+import pathlib
+import socket
+import time
+
+from lib import kube, neutron, reaper, utils
+
+CACHE = pathlib.Path("installs") / ".status-cache.json"
+CACHE_TTL = 60
+TIMEOUT = 5
+
+
+def probe_api(install_dir, timeout):
+    with kube.Client(pathlib.Path(install_dir) / "auth" / "kubeconfig",
+                     timeout=timeout) as client:
+        return client.ready()
+
+
+def probe_dns(cluster_name, base_domain):
+    names = [
+        f"api.{cluster_name}.{base_domain}",
+        f"console-openshift-console.apps.{cluster_name}.{base_domain}"
+    ]
+    return ", ".join(
+        socket.getaddrinfo(name, 443, socket.AF_INET, socket.SOCK_STREAM)[0]
+        [4][0] for name in names)
+
+
+def probe_floating_ips(config):
+    fips = reaper.find_floating_ips(
+        neutron.get_backend(config['osCloud'], config.get('openstackBackend')),
+        config['clusterName'], config['baseDomain'])
+    if not fips:
+        raise Exception("no floating ips")
+    return ", ".join(sorted(fip['floating_ip_address'] for fip in fips))
+
+
+def _probe(func, timeout):
+    start = time.monotonic()
+    try:
+        detail, ok = utils.in_thread(func).result(timeout), True
+    except concurrent.futures.TimeoutError:
+        detail, ok = f"timed out after {timeout}s", False
+    except Exception as exception:  # pylint: disable=broad-except
+        detail, ok = str(exception) or type(exception).__name__, False
+    return {
+        'ok': ok,
+        'detail': str(detail).strip(),
+        'elapsed': round(time.monotonic() - start, 3)
+    }
+
+
+def check(config, timeout=TIMEOUT):
+    """Returns the status of a cluster with the result of every probe"""
+    install_dir = pathlib.Path("installs") / config['clusterName']
+    if not (install_dir / "metadata.json").exists():
+        return {'installed': False, 'probes': {}, 'time': time.time()}
+    probes = {
+        'api':
+        lambda: probe_api(install_dir, timeout),
+        'dns':
+        lambda: probe_dns(config['clusterName'], config['baseDomain']),
+        'floating-ips':
+        lambda: probe_floating_ips(config),
+    }
+    with concurrent.futures.ThreadPoolExecutor(len(probes)) as pool:
+        results = dict(
+            zip(probes,
+                pool.map(lambda func: _probe(func, timeout),
+                         probes.values())))
+    return {'installed': True, 'probes': results, 'time': time.time()}
+
+
+def _load_cache():
+    try:
+        return json.loads(CACHE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    utils.write_atomic(CACHE, json.dumps(cache, indent=2))
+
+
+def status(configs, ttl=CACHE_TTL, timeout=TIMEOUT):
+    """Returns the status of every profile of configs, a dict of profile
+    name to config, probing at the same time the clusters which are not in
+    the cache or whose status is older than ttl seconds"""
+    cache = _load_cache()
+    now = time.time()
+    results = {}
+    stale = {}
+    for name, config in configs.items():
+        cached = cache.get(config['clusterName'])
+        if cached and now - cached['time'] < ttl:
+            results[name] = cached
+        else:
+            stale[name] = config
+    if stale:
+        with concurrent.futures.ThreadPoolExecutor(len(stale)) as pool:
+            for name, result in zip(
+                    stale,
+                    pool.map(lambda config: check(config, timeout),
+                             stale.values())):
+                results[name] = result
+                cache[stale[name]['clusterName']] = result
+        _save_cache(cache)
+    return results
@@ -0,0 +1,136 @@
+"""Module following the .openshift_install.log of an install incrementally"""
+import datetime
+import pathlib
+import re
+
+LINE_RE = re.compile(r'^time="(?P<time>[^"]+)" level=(?P<level>\w+) '
+                     r'msg=(?:"(?P<msg>(?:[^"\\]|\\.)*)"|(?P<bare>\S*))')
+
+# messages of the installer marking the start of a phase, in the order they
+# happen during an install
+PHASES = [
+    ("infrastructure", re.compile(r"^Creating infrastructure resources")),
+    ("api", re.compile(r"^Waiting up to \S+ for the Kubernetes API")),
+    ("bootstrap", re.compile(r"^Waiting up to \S+ for bootstrapping")),
+    ("bootstrap-complete",
+     re.compile(r"^(Destroying the bootstrap resources|"
+                r"It is now safe to remove the bootstrap resources)")),
+    ("cluster", re.compile(r"^Waiting up to \S+ for the cluster .* to "
+                           r"initialize")),
+    ("console", re.compile(r"^Waiting up to \S+ for the openshift-console")),
+    ("install-complete", re.compile(r"^Install complete!")),
+]
+
+# only a new create cluster consumes the install-config, the log of the
+# directory is appended to so this is where another install starts
+RESTART = re.compile(r"^Consuming Install Config from target directory")
+
+
+def parse_line(line):
+    """Returns the time, level and message of a log line, or None if it
+    isn't one"""
+    match = LINE_RE.match(line.rstrip('\n'))
+    if not match:
+        return None
+    try:
+        when = datetime.datetime.fromisoformat(
+            match.group('time').replace('Z', '+00:00'))
+    except ValueError:
+        when = None
+    msg = match.group('msg')
+    if msg is None:
+        msg = match.group('bare')
+    return when, match.group('level'), msg.replace('\\"', '"')
+
+
+class LogFollower():
+    """Returns the lines appended to a file since the last call, only
+    reading what's new from the stored offset"""
+    def __init__(self, path, offset=0):
+        self.path = pathlib.Path(path)
+        self.offset = offset
+        self._partial = b""
+        self._stat = None
+
+    def changed(self):
+        """Cheap check with stat if the file changed since the last read"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return False
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key == self._stat:
+            return False
+        self._stat = key
+        if stat.st_size < self.offset:
+            # truncated or replaced, start again
+            self.offset = 0
+            self._partial = b""
+        return True
+
+    @property
+    def position(self):
+        """Offset of the first line not returned yet"""
+        return self.offset - len(self._partial)
+
+    def read_lines(self):
+        if not self.changed():
+            return []
+        with self.path.open('rb') as fp:
+            fp.seek(self.offset)
+            data = fp.read()
+        self.offset += len(data)
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return [line.decode(errors='replace') for line in lines]
+
+
+class InstallLog():
+    """Tracks the phases and the last error of an install from its log"""
+    def __init__(self, install_dir, offset=0):
+        self.follower = LogFollower(
+            pathlib.Path(install_dir) / ".openshift_install.log", offset)
+        self.phases = {}
+        self.phase = None
+        self.last_error = None
+        self.started = None
+        self.updated = None
+        self.failed = False
+
+    def poll(self):
+        """Reads the new lines of the log and returns the list of
+        (phase, time) reached since the last poll"""
+        reached = []
+        for line in self.follower.read_lines():
+            parsed = parse_line(line)
+            if parsed is None:
+                continue
+            when, level, msg = parsed
+            if self.started is None or RESTART.match(msg):
+                self.phases = {}
+                self.phase = None
+                self.last_error = None
+                self.started = when
+            self.updated = when
+            if level in ('error', 'fatal'):
+                self.last_error = msg
+            if level == 'fatal':
+                self.failed = True
+            elif level == 'info':
+                # a wait-for run after a failure carries on the install
+                self.failed = False
+            for name, regexp in PHASES:
+                if name not in self.phases and regexp.match(msg):
+                    self.phases[name] = when
+                    self.phase = name
+                    reached.append((name, when))
+        return reached
+
+    def durations(self):
+        """Returns the seconds spent in each phase which has finished"""
+        result = {}
+        reached = [(name, self.phases[name]) for name, _ in PHASES
+                   if name in self.phases and self.phases[name]]
+        for (name, start), (_, end) in zip(reached, reached[1:]):
+            result[name] = (end - start).total_seconds()
+        return result
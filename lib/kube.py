@@ -0,0 +1,164 @@
+"""Module talking to the Kubernetes API of a cluster from its kubeconfig
+
+A small client on top of a requests session, the connection is reused by all
+the calls so post install tasks don't need to fork oc for every object.
+"""
+import base64
+import os
+import pathlib
+import tempfile
+
+import requests
+import yaml
+
+
+class KubeError(Exception):
+    def __init__(self, method, path, response):
+        self.status = response.status_code
+        try:
+            message = response.json().get('message', response.text)
+        except ValueError:
+            message = response.text
+        super().__init__(f"{method} {path}: {self.status} {message}")
+
+
+def _named(items, name):
+    for item in items:
+        if item['name'] == name:
+            return item
+    raise Exception(f"Cannot find {name} in kubeconfig")
+
+
+class Client():
+    def __init__(self, kubeconfig, timeout=30):
+        config = yaml.safe_load(pathlib.Path(kubeconfig).read_text())
+        context = _named(config['contexts'],
+                         config['current-context'])['context']
+        cluster = _named(config['clusters'], context['cluster'])['cluster']
+        user = _named(config['users'], context['user'])['user']
+
+        self.server = cluster['server'].rstrip('/')
+        self.timeout = timeout
+        self._tmpdir = tempfile.mkdtemp(prefix="moumoustall-kube-")
+        self.session = requests.Session()
+
+        if cluster.get('insecure-skip-tls-verify'):
+            self.session.verify = False
+        elif 'certificate-authority-data' in cluster:
+            self.session.verify = self._datafile(
+                "ca.crt", cluster['certificate-authority-data'])
+        elif 'certificate-authority' in cluster:
+            self.session.verify = cluster['certificate-authority']
+
+        if 'client-certificate-data' in user:
+            self.session.cert = (self._datafile(
+                "client.crt", user['client-certificate-data']),
+                                 self._datafile("client.key",
+                                                user['client-key-data']))
+        elif 'client-certificate' in user:
+            self.session.cert = (user['client-certificate'],
+                                 user['client-key'])
+        if 'token' in user:
+            self.session.headers['Authorization'] = f"Bearer {user['token']}"
+
+    def _datafile(self, name, data):
+        path = os.path.join(self._tmpdir, name)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(base64.b64decode(data))
+        return path
+
+    def close(self):
+        self.session.close()
+        for path in pathlib.Path(self._tmpdir).iterdir():
+            path.unlink()
+        os.rmdir(self._tmpdir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, method, path, body=None, content_type=None,
+                timeout=None):
+        headers = {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        response = self.session.request(method,
+                                        self.server + path,
+                                        json=body,
+                                        headers=headers,
+                                        timeout=timeout or self.timeout)
+        if response.status_code >= 400:
+            raise KubeError(method, path, response)
+        if not response.content:
+            return None
+        return response.json()
+
+    def ready(self, timeout=None):
+        """Returns the answer of the API server readiness endpoint, raises if
+        it's not ready"""
+        response = self.session.get(self.server + "/readyz",
+                                    timeout=timeout or self.timeout)
+        if response.status_code != 200:
+            raise KubeError("GET", "/readyz", response)
+        return response.text
+
+    def get(self, path, missing_ok=False):
+        try:
+            return self.request("GET", path)
+        except KubeError as error:
+            if missing_ok and error.status == 404:
+                return None
+            raise
+
+    def create(self, path, body):
+        return self.request("POST", path, body)
+
+    def patch(self, path, body):
+        """Merge patch of an object"""
+        return self.request("PATCH", path, body,
+                            "application/merge-patch+json")
+
+    def delete(self, path, missing_ok=True):
+        try:
+            return self.request("DELETE", path)
+        except KubeError as error:
+            if missing_ok and error.status == 404:
+                return None
+            raise
+
+    def apply(self, path, body):
+        """Creates the object body in the collection path, or replaces it if
+        it already exists"""
+        try:
+            return self.create(path, body)
+        except KubeError as error:
+            if error.status != 409:
+                raise
+        name = f"{path}/{body['metadata']['name']}"
+        current = self.get(name)
+        body = dict(body,
+                    metadata=dict(body['metadata'],
+                                  resourceVersion=current['metadata']
+                                  ['resourceVersion']))
+        return self.request("PUT", name, body)
+
+
+def secret(name, namespace, data, secret_type="Opaque"):
+    """Returns a Secret object with the values of data base64 encoded"""
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Secret',
+        'type': secret_type,
+        'metadata': {
+            'name': name,
+            'namespace': namespace
+        },
+        'data': {
+            key: base64.b64encode(value if isinstance(value, bytes) else value.
+                                  encode()).decode()
+            for key, value in data.items()
+        },
+    }
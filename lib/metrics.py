@@ -0,0 +1,136 @@
+"""Module recording how long each step of an install takes
+
+Every step start and end is appended as a JSON line to an events file, and
+the durations can be exported as a prometheus textfile collector file.
+"""
+import contextlib
+import json
+import pathlib
+import threading
+import time
+
+from lib import installlog, utils
+
+
+class Recorder():
+    def __init__(self, cluster_name, events_path=None, textfile_dir=None):
+        self.cluster_name = cluster_name
+        self.events_path = events_path and pathlib.Path(events_path)
+        self.textfile_dir = textfile_dir and pathlib.Path(textfile_dir)
+        self.durations = {}
+        self.success = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def event(self, event, **fields):
+        """Appends an event to the events file"""
+        if not self.events_path:
+            return
+        line = json.dumps(
+            dict(time=time.time(),
+                 cluster=self.cluster_name,
+                 event=event,
+                 **fields))
+        with self._lock:
+            self.events_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.events_path.open('a') as fp:
+                fp.write(line + "\n")
+
+    @contextlib.contextmanager
+    def step(self, name):
+        """Times the code run in the context as the step name"""
+        self.event("step_start", step=name)
+        start = time.monotonic()
+        success = False
+        try:
+            yield
+            success = True
+        finally:
+            elapsed = time.monotonic() - start
+            self.durations[name] = elapsed
+            self.success[name] = success
+            self.event("step_end",
+                       step=name,
+                       duration=round(elapsed, 3),
+                       success=success)
+            self.write_textfile()
+
+    def phase(self, name, when):
+        """Records an installer phase read from its log"""
+        self.event("installer_phase",
+                   phase=name,
+                   installer_time=when and when.isoformat())
+
+    def installer_phases(self, durations):
+        self.phases.update(durations)
+        self.write_textfile()
+
+    @contextlib.contextmanager
+    def follow_installer(self, install_dir, interval=5):
+        """Follows the installer log while the code in the context runs,
+        recording the phases the installer goes through, the log is
+        appended to by every run so only what comes next is read"""
+        path = pathlib.Path(install_dir) / ".openshift_install.log"
+        log = installlog.InstallLog(install_dir,
+                                    path.stat().st_size if path.exists() else 0)
+        stop = threading.Event()
+
+        def follow():
+            while True:
+                for name, when in log.poll():
+                    self.phase(name, when)
+                if stop.wait(interval):
+                    break
+            for name, when in log.poll():
+                self.phase(name, when)
+            self.installer_phases(log.durations())
+
+        thread = threading.Thread(target=follow, daemon=True)
+        thread.start()
+        try:
+            yield log
+        finally:
+            stop.set()
+            thread.join()
+
+    def write_textfile(self):
+        """Writes the metrics for the prometheus node exporter textfile
+        collector, atomically so it never reads a partial file"""
+        if not self.textfile_dir:
+            return
+        labels = f'cluster="{self.cluster_name}"'
+        lines = [
+            "# HELP moumoustall_step_duration_seconds Duration of an install"
+            " step.",
+            "# TYPE moumoustall_step_duration_seconds gauge",
+        ]
+        for step, duration in self.durations.items():
+            lines.append(f'moumoustall_step_duration_seconds{{{labels},'
+                         f'step="{step}"}} {duration:.3f}')
+        lines += [
+            "# HELP moumoustall_step_success Whether an install step"
+            " succeeded.",
+            "# TYPE moumoustall_step_success gauge",
+        ]
+        for step, success in self.success.items():
+            lines.append(f'moumoustall_step_success{{{labels},'
+                         f'step="{step}"}} {int(success)}')
+        lines += [
+            "# HELP moumoustall_installer_phase_duration_seconds Duration of"
+            " a phase of openshift-install.",
+            "# TYPE moumoustall_installer_phase_duration_seconds gauge",
+        ]
+        for phase, duration in self.phases.items():
+            lines.append(f'moumoustall_installer_phase_duration_seconds'
+                         f'{{{labels},phase="{phase}"}} {duration:.3f}')
+        lines += [
+            "# HELP moumoustall_last_update_timestamp_seconds Last time the"
+            " metrics were updated.",
+            "# TYPE moumoustall_last_update_timestamp_seconds gauge",
+            f"moumoustall_last_update_timestamp_seconds{{{labels}}} "
+            f"{time.time():.0f}",
+        ]
+        with self._lock:
+            utils.write_atomic(
+                self.textfile_dir / f"moumoustall_{self.cluster_name}.prom",
+                "\n".join(lines) + "\n")
@@ -0,0 +1,89 @@
+"""Module pointing installs to a local mirror of the release images
+
+The rendered install-config gets the imageContentSources and the
+additionalTrustBundle of the mirror, and the release of the installer is
+mirrored with oc before the install starts. A release is mirrored only once
+per registry, under a lock so parallel installs of the same version wait for
+the first one and then pull from the nearby mirror.
+"""
+import pathlib
+import re
+import shutil
+import subprocess
+
+import yaml
+
+from lib import utils
+
+SOURCES = (
+    "quay.io/openshift-release-dev/ocp-release",
+    "quay.io/openshift-release-dev/ocp-v4.0-art-dev",
+)
+
+
+def inject(rendered, registry, trust_bundle=None):
+    """Returns the rendered install-config with the mirror of registry as
+    the source of the release images"""
+    current = yaml.safe_load(rendered)
+    for key in ('imageContentSources', 'additionalTrustBundle'):
+        if key in current:
+            raise Exception(f"The template already sets {key}, cannot add "
+                            f"the mirror {registry}")
+    # appended as new top level keys so the template is kept as it is
+    lines = ["imageContentSources:"]
+    for source in SOURCES:
+        lines += ["- mirrors:", f"  - {registry}", f"  source: {source}"]
+    if trust_bundle:
+        lines.append("additionalTrustBundle: |")
+        lines += [f"  {line}" for line in trust_bundle.strip().splitlines()]
+    return rendered.rstrip('\n') + '\n' + '\n'.join(lines) + '\n'
+
+
+def release_image(install_binary):
+    """Returns the version and the release image of an installer"""
+    output = subprocess.run([str(install_binary), "version"],
+                            stdout=subprocess.PIPE,
+                            check=True,
+                            text=True).stdout
+    version = re.search(r"^openshift-install (\S+)", output, re.M)
+    image = re.search(r"^release image (\S+)", output, re.M)
+    if not (version and image):
+        raise Exception(f"Cannot find the release image of {install_binary}")
+    return version.group(1), image.group(1)
+
+
+def prewarm(install_binary, registry, pull_secret):
+    """Mirrors the release of install_binary to registry unless it was
+    done already, returns True if it mirrored it"""
+    install_binary = pathlib.Path(install_binary)
+    name = re.sub(r"[^\w.-]", "_", registry)
+    marker = install_binary.parent / f".mirrored-{name}"
+    if marker.exists():
+        return False
+    oc = shutil.which("oc")
+    if not oc:
+        raise Exception("oc is needed to mirror the release")
+    with utils.locked(install_binary.parent / f".mirror-{name}.lock"):
+        if marker.exists():
+            return False
+        version, image = release_image(install_binary)
+        ret = subprocess.run([
+            oc, "adm", "release", "mirror", "-a",
+            str(pull_secret), f"--from={image}", f"--to={registry}",
+            f"--to-release-image={registry}:{version}"
+        ],
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT,
+                             text=True,
+                             check=False)
+        if ret.returncode != 0:
+            output = ret.stdout.strip().splitlines() or [ret.returncode]
+            raise Exception(f"Mirroring {image} failed: {output[-1]}")
+        marker.write_text(image + "\n")
+    return True
+
+
+def start_prewarm(install_binary, registry, pull_secret):
+    """Mirrors the release in the background, returns a future of
+    prewarm()"""
+    return utils.in_thread(prewarm, install_binary, registry, pull_secret)
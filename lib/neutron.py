@@ -0,0 +1,343 @@
+"""Module implements floating ip methods against openstack
+
+Backends are pluggable, `sdk` keeps one authenticated openstacksdk connection
+per cloud, `cli` spawns the openstack command for every call and `fake` keeps
+everything in memory for testing the orchestration without a cloud.
+"""
+import itertools
+import json
+import os
+import subprocess
+import threading
+
+try:
+    import openstack
+except ImportError:
+    openstack = None
+
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def _floating_ip(fid, address, description="", port_id=None, tags=None):
+    return {
+        'id': fid,
+        'floating_ip_address': address,
+        'description': description or "",
+        'port_id': port_id,
+        'tags': list(tags or []),
+    }
+
+
+def _usage(limit, used):
+    """Quota of a resource, a limit of -1 means unlimited"""
+    return {'limit': int(limit), 'used': int(used)}
+
+
+class CLIBackend():
+    """Talks to openstack by running the openstack command line"""
+    # if list_floating_ips filters on the description on the server
+    FILTERS_DESCRIPTION = False
+
+    def __init__(self, os_cloud):
+        self.os_cloud = os_cloud
+
+    def _run(self, *args):
+        command = ["openstack", "--os-cloud", self.os_cloud] + list(args)
+        try:
+            result = subprocess.run(command,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    check=True)
+        except subprocess.CalledProcessError as exception:
+            raise Exception(f"Error running {' '.join(command)}: "
+                            f"{exception.output.decode(errors='replace')}")
+        return result.stdout
+
+    def create_floating_ip(self, network, description, tags=None):
+        args = []
+        for tag in tags or []:
+            args += ["--tag", tag]
+        ret = json.loads(
+            self._run("floating", "ip", "create", "-f", "json",
+                      "--description", description, *args, network))
+        return _floating_ip(ret['id'], ret['floating_ip_address'],
+                            ret.get('description'), ret.get('port_id'),
+                            ret.get('tags'))
+
+    def set_floating_ip_port(self, ip_addr, port):
+        self._run("floating", "ip", "set", "--port", port, ip_addr)
+
+    def unset_floating_ip_port(self, ip_addr):
+        self._run("floating", "ip", "unset", "--port", ip_addr)
+
+    def update_floating_ip(self, ip_addr, description=None, tags=None):
+        args = []
+        if description is not None:
+            args += ["--description", description]
+        if tags is not None:
+            args.append("--no-tag")
+            for tag in tags:
+                args += ["--tag", tag]
+        self._run("floating", "ip", "set", *args, ip_addr)
+
+    def list_floating_ips(self, tags=None, description=None):
+        args = ["--tags", ",".join(tags)] if tags else []
+        ret = json.loads(
+            self._run("floating", "ip", "list", "-f", "json", "--long",
+                      *args))
+        # the command line can't filter on the description
+        return [
+            _floating_ip(i['ID'], i['Floating IP Address'],
+                         i.get('Description'), i.get('Port'), i.get('Tags'))
+            for i in ret
+            if description is None or i.get('Description') == description
+        ]
+
+    def delete_floating_ip(self, ip_addr):
+        self._run("floating", "ip", "delete", ip_addr)
+
+    def get_quota_usage(self):
+        limits = {
+            i['Name']: i['Value']
+            for i in json.loads(
+                self._run("limits", "show", "--absolute", "-f", "json"))
+        }
+        quota = json.loads(self._run("quota", "show", "-f", "json"))
+        return {
+            'cores': _usage(limits['maxTotalCores'], limits['totalCoresUsed']),
+            'ram': _usage(limits['maxTotalRAMSize'], limits['totalRAMUsed']),
+            'instances':
+            _usage(limits['maxTotalInstances'], limits['totalInstancesUsed']),
+            'floating_ips':
+            _usage(quota.get('floating-ips', -1),
+                   len(self.list_floating_ips())),
+        }
+
+    def get_flavor(self, name):
+        ret = json.loads(self._run("flavor", "show", "-f", "json", name))
+        return {'vcpus': int(ret['vcpus']), 'ram': int(ret['ram'])}
+
+
+class SDKBackend():
+    """Talks to openstack with one openstacksdk connection, the keystone
+    token is reused for every call"""
+    FILTERS_DESCRIPTION = True
+
+    def __init__(self, os_cloud):
+        if openstack is None:
+            raise Exception("openstacksdk is not installed")
+        self.os_cloud = os_cloud
+        self.conn = openstack.connect(cloud=os_cloud)
+        self._networks = {}
+
+    def _network_id(self, network):
+        if network not in self._networks:
+            self._networks[network] = self.conn.network.find_network(
+                network, ignore_missing=False).id
+        return self._networks[network]
+
+    def _find(self, ip_addr):
+        for fip in self.conn.network.ips(floating_ip_address=ip_addr):
+            return fip
+        raise Exception(f"Could not find floating ip {ip_addr}")
+
+    @staticmethod
+    def _convert(fip):
+        return _floating_ip(fip.id, fip.floating_ip_address, fip.description,
+                            fip.port_id, fip.tags)
+
+    def create_floating_ip(self, network, description, tags=None):
+        fip = self.conn.network.create_ip(
+            floating_network_id=self._network_id(network),
+            description=description)
+        if tags:
+            fip = self.conn.network.set_tags(fip, list(tags))
+        return self._convert(fip)
+
+    def set_floating_ip_port(self, ip_addr, port):
+        port_id = self.conn.network.find_port(port, ignore_missing=False).id
+        self.conn.network.update_ip(self._find(ip_addr), port_id=port_id)
+
+    def unset_floating_ip_port(self, ip_addr):
+        self.conn.network.update_ip(self._find(ip_addr), port_id=None)
+
+    def update_floating_ip(self, ip_addr, description=None, tags=None):
+        fip = self._find(ip_addr)
+        if description is not None:
+            fip = self.conn.network.update_ip(fip, description=description)
+        if tags is not None:
+            self.conn.network.set_tags(fip, list(tags))
+
+    def list_floating_ips(self, tags=None, description=None):
+        filters = {}
+        if tags:
+            filters['tags'] = ",".join(tags)
+        if description is not None:
+            filters['description'] = description
+        return [
+            self._convert(fip) for fip in self.conn.network.ips(**filters)
+        ]
+
+    def delete_floating_ip(self, ip_addr):
+        self.conn.network.delete_ip(self._find(ip_addr))
+
+    def get_quota_usage(self):
+        absolute = self.conn.compute.get_limits().absolute
+        fips = self.conn.network.get_quota(self.conn.current_project_id,
+                                           details=True).floating_ips
+        return {
+            'cores': _usage(absolute.total_cores, absolute.total_cores_used),
+            'ram': _usage(absolute.total_ram, absolute.total_ram_used),
+            'instances': _usage(absolute.instances, absolute.instances_used),
+            'floating_ips': _usage(fips['limit'], fips['used']),
+        }
+
+    def get_flavor(self, name):
+        flavor = self.conn.compute.find_flavor(name, ignore_missing=False)
+        return {'vcpus': flavor.vcpus, 'ram': flavor.ram}
+
+
+class FakeBackend():
+    """In memory backend, clouds share their state in the class so every
+    backend for the same cloud sees the same floating ips"""
+    FILTERS_DESCRIPTION = True
+    clouds = {}
+    # cloud -> resource -> (limit, used) and flavor name -> vcpus and ram,
+    # to be set by the tests
+    quotas = {}
+    flavors = {}
+    # called with the cloud and the name of every call, ie: to count them
+    on_call = None
+    _lock = threading.Lock()
+    _counter = itertools.count(1)
+
+    def __init__(self, os_cloud):
+        self.os_cloud = os_cloud
+        self.calls = {}
+
+    @property
+    def ips(self):
+        """The floating ips of the cloud, looked up every time since the
+        backends are cached and the tests start again with empty clouds"""
+        return FakeBackend.clouds.setdefault(self.os_cloud, {})
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if FakeBackend.on_call:
+            FakeBackend.on_call(self.os_cloud, name)  # pylint: disable=not-callable
+
+    def create_floating_ip(self, network, description, tags=None):
+        self._call('create_floating_ip')
+        with self._lock:
+            number = next(self._counter)
+            fip = _floating_ip(f"fake-{number}",
+                               f"10.{number // 65536 % 256}."
+                               f"{number // 256 % 256}.{number % 256}",
+                               description,
+                               tags=tags)
+            fip['network'] = network
+            self.ips[fip['floating_ip_address']] = fip
+        return dict(fip)
+
+    def set_floating_ip_port(self, ip_addr, port):
+        self._call('set_floating_ip_port')
+        with self._lock:
+            if ip_addr not in self.ips:
+                raise Exception(f"Could not find floating ip {ip_addr}")
+            self.ips[ip_addr]['port_id'] = port
+
+    def unset_floating_ip_port(self, ip_addr):
+        self._call('unset_floating_ip_port')
+        with self._lock:
+            if ip_addr not in self.ips:
+                raise Exception(f"Could not find floating ip {ip_addr}")
+            self.ips[ip_addr]['port_id'] = None
+
+    def update_floating_ip(self, ip_addr, description=None, tags=None):
+        self._call('update_floating_ip')
+        with self._lock:
+            if ip_addr not in self.ips:
+                raise Exception(f"Could not find floating ip {ip_addr}")
+            if description is not None:
+                self.ips[ip_addr]['description'] = description
+            if tags is not None:
+                self.ips[ip_addr]['tags'] = list(tags)
+
+    def list_floating_ips(self, tags=None, description=None):
+        self._call('list_floating_ips')
+        with self._lock:
+            return [
+                dict(fip) for fip in self.ips.values()
+                if set(tags or []).issubset(fip['tags']) and (
+                    description is None or fip['description'] == description)
+            ]
+
+    def delete_floating_ip(self, ip_addr):
+        self._call('delete_floating_ip')
+        with self._lock:
+            if self.ips.pop(ip_addr, None) is None:
+                raise Exception(f"Could not find floating ip {ip_addr}")
+
+    def get_quota_usage(self):
+        self._call('get_quota_usage')
+        with self._lock:
+            quota = self.quotas.get(self.os_cloud, {})
+            result = {
+                name: _usage(*quota.get(name, (-1, 0)))
+                for name in ('cores', 'ram', 'instances')
+            }
+            result['floating_ips'] = _usage(
+                quota.get('floating_ips', (-1, 0))[0], len(self.ips))
+        return result
+
+    def get_flavor(self, name):
+        self._call('get_flavor')
+        return dict(self.flavors.get(name, {'vcpus': 4, 'ram': 16384}))
+
+
+def cluster_tag(cluster_name):
+    """Returns the tag set on every floating ip created for cluster_name"""
+    return f"moumoustall-cluster={cluster_name}"
+
+
+def description_prefix(cluster_name):
+    """Returns how the descriptions of the floating ips of cluster_name
+    start, whatever their base domain"""
+    return f"cluster: {cluster_name} , "
+
+
+def descriptions(cluster_name, base_domain):
+    """Returns the descriptions of the api and apps floating ips"""
+    prefix = description_prefix(cluster_name)
+    return {
+        "api": f"{prefix}api.{cluster_name}.{base_domain}",
+        "apps": f"{prefix}*.apps.{cluster_name}.{base_domain}",
+    }
+
+
+BACKENDS = {
+    'cli': CLIBackend,
+    'sdk': SDKBackend,
+    'fake': FakeBackend,
+}
+
+
+def get_backend(os_cloud, kind=None):
+    """Returns the backend for os_cloud, kind is one of sdk, cli or fake and
+    default to sdk when openstacksdk is installed or cli otherwise. Backends
+    are cached per cloud so the authentication is done only once, per process
+    since the sdk session and its pooled connections should not be reused
+    across a fork."""
+    if not kind:
+        kind = 'sdk' if openstack is not None else 'cli'
+    if kind not in BACKENDS:
+        raise Exception(f"Unknown openstack backend {kind}")
+    key = (os.getpid(), kind, os_cloud)
+    with _BACKENDS_LOCK:
+        if key not in _BACKENDS:
+            for cached in [k for k in _BACKENDS if k[0] != os.getpid()]:
+                del _BACKENDS[cached]
+            _BACKENDS[key] = BACKENDS[kind](os_cloud)
+        return _BACKENDS[key]
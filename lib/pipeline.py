@@ -0,0 +1,86 @@
+"""Module running a small dependency graph of steps, a step starts as soon as
+all the steps it requires are done so independent steps run concurrently"""
+import concurrent.futures
+import time
+
+
+class Step():
+    def __init__(self, name, func, requires=()):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+
+
+class StepResult():
+    def __init__(self, name, error=None, elapsed=0.0, skipped=False):
+        self.name = name
+        self.error = error
+        self.elapsed = elapsed
+        self.skipped = skipped
+
+    @property
+    def ok(self):
+        return self.error is None and not self.skipped
+
+    def __repr__(self):
+        if self.skipped:
+            return f"{self.name}: skipped"
+        if self.error is not None:
+            return f"{self.name}: failed after {self.elapsed:.1f}s: {self.error}"
+        return f"{self.name}: done in {self.elapsed:.1f}s"
+
+
+def _timed(step):
+    start = time.monotonic()
+    try:
+        step.func()
+    except Exception as exception:  # pylint: disable=broad-except
+        return StepResult(step.name, exception, time.monotonic() - start)
+    return StepResult(step.name, elapsed=time.monotonic() - start)
+
+
+def run(steps, max_workers=None):
+    """Run steps and returns a dict of step name to StepResult, a step whose
+    requirements failed is skipped."""
+    steps = {step.name: step for step in steps}
+    for step in steps.values():
+        for requirement in step.requires:
+            if requirement not in steps:
+                raise Exception(
+                    f"Step {step.name} requires unknown step {requirement}")
+
+    results = {}
+    pending = dict(steps)
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers or
+                                               len(steps) or 1) as pool:
+        while pending or running:
+            ready = True
+            while ready:
+                ready = [
+                    step for step in pending.values()
+                    if all(r in results for r in step.requires)
+                ]
+                for step in ready:
+                    del pending[step.name]
+                    if all(results[r].ok for r in step.requires):
+                        running[pool.submit(_timed, step)] = step
+                    else:
+                        results[step.name] = StepResult(step.name,
+                                                        skipped=True)
+            if not running:
+                if pending:
+                    raise Exception("Circular dependencies between steps: " +
+                                    ", ".join(pending))
+                break
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                results[step.name] = future.result()
+    return results
+
+
+def failures(results):
+    """Returns the results which did not succeed"""
+    return [result for result in results.values() if not result.ok]
@@ -0,0 +1,126 @@
+"""Module with the tasks done on a cluster once it's installed, talking to
+its API with a lib.kube client"""
+import json
+import pathlib
+
+from lib import kube, utils
+
+ADMINS_BINDING = "moumoustall-htpasswd-cluster-admins"
+ROUTER_CERTS = "router-certs"
+
+
+def htpasswd_users(path):
+    return [
+        line.split(':', 1)[0] for line in pathlib.Path(path).read_text().
+        splitlines() if line.strip() and not line.startswith('#')
+    ]
+
+
+def add_htpasswd(client, path):
+    """Adds the htpasswd identity provider with the users of path as cluster
+    admins, all bound in one ClusterRoleBinding, and removes kubeadmin"""
+    client.apply(
+        "/api/v1/namespaces/openshift-config/secrets",
+        kube.secret("htpasswd-secret", "openshift-config",
+                    {'htpasswd': pathlib.Path(path).read_bytes()}))
+    client.patch(
+        "/apis/config.openshift.io/v1/oauths/cluster", {
+            'spec': {
+                'identityProviders': [{
+                    'htpasswd': {
+                        'fileData': {
+                            'name': 'htpasswd-secret'
+                        }
+                    },
+                    'mappingMethod': 'claim',
+                    'name': 'htpasswd',
+                    'type': 'HTPasswd',
+                }]
+            }
+        })
+    client.apply(
+        "/apis/rbac.authorization.k8s.io/v1/clusterrolebindings", {
+            'apiVersion': 'rbac.authorization.k8s.io/v1',
+            'kind': 'ClusterRoleBinding',
+            'metadata': {
+                'name': ADMINS_BINDING
+            },
+            'roleRef': {
+                'apiGroup': 'rbac.authorization.k8s.io',
+                'kind': 'ClusterRole',
+                'name': 'cluster-admin',
+            },
+            'subjects': [{
+                'apiGroup': 'rbac.authorization.k8s.io',
+                'kind': 'User',
+                'name': user,
+            } for user in htpasswd_users(path)],
+        })
+    client.delete("/api/v1/namespaces/kube-system/secrets/kubeadmin")
+
+
+def scale_to_masters(client):
+    """Makes the masters schedulable and scales down all the machinesets"""
+    client.patch("/apis/config.openshift.io/v1/schedulers/cluster",
+                 {'spec': {
+                     'mastersSchedulable': True
+                 }})
+    path = ("/apis/machine.openshift.io/v1beta1/namespaces/"
+            "openshift-machine-api/machinesets")
+    for machineset in client.get(path)['items']:
+        client.patch(f"{path}/{machineset['metadata']['name']}/scale",
+                     {'spec': {
+                         'replicas': 0
+                     }})
+
+
+def router_certs_secret(fullchain, key):
+    return kube.secret(ROUTER_CERTS,
+                       "openshift-ingress", {
+                           'tls.crt': pathlib.Path(fullchain).read_bytes(),
+                           'tls.key': pathlib.Path(key).read_bytes(),
+                       },
+                       secret_type="kubernetes.io/tls")
+
+
+def install_router_certs(client, fullchain, key):
+    """Pushes the router certificates as a TLS secret and make the default
+    ingress controller use it"""
+    client.apply("/api/v1/namespaces/openshift-ingress/secrets",
+                 router_certs_secret(fullchain, key))
+    client.patch(
+        "/apis/operator.openshift.io/v1/namespaces/openshift-ingress-operator/"
+        "ingresscontrollers/default",
+        {'spec': {
+            'defaultCertificate': {
+                'name': ROUTER_CERTS
+            }
+        }})
+
+
+def write_router_certs_manifests(install_dir, fullchain, key):
+    """Writes the router TLS secret and the default ingress controller using
+    it in the openshift manifests of install_dir, created with openshift-install
+    create manifests, so the cluster comes up with them"""
+    openshift = pathlib.Path(install_dir) / "openshift"
+    utils.write_atomic(openshift / "99_router-certs-secret.yaml",
+                       json.dumps(router_certs_secret(fullchain, key),
+                                  indent=2),
+                       mode=0o600)
+    utils.write_atomic(
+        openshift / "cluster-ingress-default-ingresscontroller.yaml",
+        json.dumps(
+            {
+                'apiVersion': 'operator.openshift.io/v1',
+                'kind': 'IngressController',
+                'metadata': {
+                    'name': 'default',
+                    'namespace': 'openshift-ingress-operator'
+                },
+                'spec': {
+                    'defaultCertificate': {
+                        'name': ROUTER_CERTS
+                    }
+                },
+            },
+            indent=2))
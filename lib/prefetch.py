@@ -0,0 +1,74 @@
+"""Module downloading the installers of many profiles up front"""
+import concurrent.futures
+import pathlib
+
+from lib import downloader
+
+
+def installer_spec(config):
+    """Returns the channel and version of the installer of a profile"""
+    channel = "installer_channel" in config and config[
+        'installer_channel'] or 'prod'
+    return channel, config['installerVersion']
+
+
+class PrefetchReport():
+    def __init__(self):
+        self.binaries = {}
+        self.hits = []
+        self.misses = []
+        self.failed = {}
+
+    def __repr__(self):
+        return (f"{len(self.hits)} cached, {len(self.misses)} downloaded, "
+                f"{len(self.failed)} failed")
+
+
+def prefetch(configs,
+             dest_directory="binaries",
+             max_workers=4,
+             offline=False) -> PrefetchReport:
+    """Resolve the installer of every profile, then download each distinct
+    version once, max_workers at a time. The report maps every channel and
+    version of the profiles to the path of its installer."""
+    report = PrefetchReport()
+    index_path = pathlib.Path(dest_directory) / downloader.INDEX_FILE
+    specs = sorted({installer_spec(config) for config in configs})
+
+    def resolve(spec):
+        return downloader.resolve(spec[1],
+                                  index_path,
+                                  source=spec[0],
+                                  offline=offline)
+
+    entries = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        futures = {pool.submit(resolve, spec): spec for spec in specs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                entries[futures[future]] = future.result()
+            except Exception as exception:  # pylint: disable=broad-except
+                report.failed[futures[future]] = exception
+
+        versions = {}
+        for spec, entry in entries.items():
+            versions.setdefault(entry['version'], entry)
+        futures = {
+            pool.submit(downloader.fetch, entry, dest_directory, offline):
+            version
+            for version, entry in versions.items()
+        }
+        paths = {}
+        for future in concurrent.futures.as_completed(futures):
+            version = futures[future]
+            try:
+                paths[version], downloaded = future.result()
+            except Exception as exception:  # pylint: disable=broad-except
+                report.failed[version] = exception
+                continue
+            (report.misses if downloaded else report.hits).append(version)
+
+    for spec, entry in entries.items():
+        if entry['version'] in paths:
+            report.binaries[spec] = paths[entry['version']]
+    return report
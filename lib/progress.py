@@ -0,0 +1,199 @@
+"""Module showing the progress of all the installs at the same time
+
+Each install log is followed incrementally with a stat check before reading,
+and what was read is checkpointed in the install directory so a new watch
+doesn't parse the whole log again. An install with no installer running for
+it and a log untouched for a while was killed or interrupted, ie: by a
+reboot, and is not waited for.
+"""
+import datetime
+import json
+import pathlib
+import subprocess
+import sys
+import time
+
+from lib import installlog, utils
+
+CHECKPOINT = ".moumoustall-progress.json"
+# seconds without the log changing before an install with no installer
+# running is considered interrupted, the installer is run several times in
+# a row when it is retried
+STALE = 120
+
+
+def _isotime(when):
+    return when and when.isoformat()
+
+
+def _fromiso(value):
+    return value and datetime.datetime.fromisoformat(value)
+
+
+def running_installs():
+    """Returns the names of the install directories an openshift-install is
+    running for, None if the processes cannot be listed"""
+    try:
+        ret = subprocess.run(["ps", "-eww", "-o", "args="],
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL,
+                             text=True,
+                             check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    names = set()
+    for line in ret.stdout.splitlines():
+        if "openshift-install" not in line:
+            continue
+        for arg in line.split():
+            if arg.startswith("--dir="):
+                names.add(pathlib.Path(arg[len("--dir="):]).name)
+    return names
+
+
+class Tracker():
+    """Follows the log of one install"""
+    def __init__(self, install_dir):
+        self.install_dir = pathlib.Path(install_dir)
+        self.name = self.install_dir.name
+        self.log = installlog.InstallLog(self.install_dir)
+        self.checkpoint = self.install_dir / CHECKPOINT
+        self.interrupted = False
+        self._load()
+
+    def _load(self):
+        try:
+            saved = json.loads(self.checkpoint.read_text())
+        except (OSError, ValueError):
+            return
+        try:
+            if self.log.follower.path.stat().st_ino != saved['inode']:
+                return
+        except FileNotFoundError:
+            return
+        self.log.follower.offset = saved['offset']
+        self.log.phases = {
+            name: _fromiso(when)
+            for name, when in saved['phases'].items()
+        }
+        self.log.phase = saved['phase']
+        self.log.last_error = saved['last_error']
+        self.log.started = _fromiso(saved['started'])
+        self.log.updated = _fromiso(saved['updated'])
+        self.log.failed = saved['failed']
+
+    def _save(self):
+        utils.write_atomic(
+            self.checkpoint,
+            json.dumps({
+                'inode': self.log.follower.path.stat().st_ino,
+                'offset': self.log.follower.position,
+                'phases':
+                {name: _isotime(when)
+                 for name, when in self.log.phases.items()},
+                'phase': self.log.phase,
+                'last_error': self.log.last_error,
+                'started': _isotime(self.log.started),
+                'updated': _isotime(self.log.updated),
+                'failed': self.log.failed,
+            }))
+
+    def poll(self):
+        """Returns True if the install changed since the last poll"""
+        offset = self.log.follower.offset
+        self.log.poll()
+        if self.log.follower.offset == offset:
+            return False
+        # written again, ie: the install was resumed
+        self.interrupted = False
+        self._save()
+        return True
+
+    @property
+    def finished(self):
+        return ('install-complete' in self.log.phases or self.log.failed
+                or self.interrupted)
+
+    def check_interrupted(self, running):
+        """Returns True if the install just got interrupted, running are the
+        installs with an installer running"""
+        if self.finished or self.name in running:
+            return False
+        try:
+            idle = time.time() - self.log.follower.path.stat().st_mtime
+        except FileNotFoundError:
+            idle = STALE + 1
+        self.interrupted = idle > STALE
+        return self.interrupted
+
+    def status(self):
+        elapsed = None
+        if self.log.started:
+            end = self.log.phases.get('install-complete')
+            if self.log.failed or self.interrupted:
+                end = self.log.updated
+            if end is None:
+                end = datetime.datetime.now(self.log.started.tzinfo)
+            elapsed = (end - self.log.started).total_seconds()
+        return {
+            'cluster': self.name,
+            'phase': self.log.phase or "starting",
+            'elapsed': elapsed and round(elapsed),
+            'failed': self.log.failed,
+            'interrupted': self.interrupted,
+            'last_error': self.log.last_error,
+        }
+
+
+def _format(status):
+    elapsed = status['elapsed'] or 0
+    icon = "💥" if status['failed'] else (
+        "✅" if status['phase'] == 'install-complete' else
+        "💤" if status['interrupted'] else "⏳")
+    line = (f"{icon} {status['cluster']:<20} {status['phase']:<20} "
+            f"{elapsed // 3600:02d}:{elapsed % 3600 // 60:02d}:"
+            f"{elapsed % 60:02d}")
+    if status['last_error']:
+        line += f" {status['last_error'][:80]}"
+    return line
+
+
+def watch(install_dirs, json_output=False, interval=2, out=sys.stdout):
+    """Shows the progress of the installs in install_dirs until all of them
+    are finished or interrupted, install_dirs is a callable returning the
+    directories with an install log to follow so new installs are picked up,
+    it returns right away when there is none. With json_output a JSON line
+    is printed each time an install changes instead of a live view."""
+    trackers = {}
+    reported = set()
+    drawn = 0
+    while True:
+        changed = False
+        for install_dir in install_dirs():
+            if install_dir not in trackers:
+                trackers[install_dir] = Tracker(install_dir)
+                changed = True
+        running = set()
+        if not all(t.finished for t in trackers.values()):
+            running = running_installs()
+        for tracker in trackers.values():
+            polled = tracker.poll()
+            interrupted = running is not None and tracker.check_interrupted(
+                running)
+            if polled or interrupted or tracker.name not in reported:
+                changed = True
+                reported.add(tracker.name)
+                if json_output:
+                    out.write(json.dumps(tracker.status()) + "\n")
+                    out.flush()
+        if not json_output:
+            lines = [_format(t.status()) for t in trackers.values()]
+            if drawn:
+                out.write(f"\x1b[{drawn}A")
+            out.write("".join(f"\x1b[2K{line}\n" for line in lines))
+            out.flush()
+            drawn = len(lines)
+        if all(t.finished for t in trackers.values()):
+            return [t.status() for t in trackers.values()]
+        if not changed:
+            time.sleep(interval)
@@ -0,0 +1,78 @@
+"""Module removing the floating ips left behind by a cluster"""
+import concurrent.futures
+
+from lib import fippool, neutron
+
+
+class ReapResult():
+    def __init__(self):
+        self.deleted = []
+        self.released = []
+        self.failed = {}
+
+    def __repr__(self):
+        return (f"deleted: {len(self.deleted)}, "
+                f"released: {len(self.released)}, "
+                f"failed: {len(self.failed)}")
+
+
+def find_floating_ips(backend, cluster_name, base_domain):
+    """Returns the floating ips of a cluster, filtered by the server on the
+    cluster tag and on the descriptions we set for the floating ips created
+    before they were tagged. The openstack command can't filter on the
+    description, it does a single listing matched on how our descriptions
+    start, which also finds the ones created with another base domain."""
+    tag = neutron.cluster_tag(cluster_name)
+    if not backend.FILTERS_DESCRIPTION:
+        prefix = neutron.description_prefix(cluster_name)
+        return [
+            fip for fip in backend.list_floating_ips()
+            if tag in fip['tags'] or (fip['description']
+                                      or "").startswith(prefix)
+        ]
+
+    found = {}
+    queries = [{'tags': [tag]}] + [{
+        'description': description
+    } for description in neutron.descriptions(cluster_name,
+                                              base_domain).values()]
+    with concurrent.futures.ThreadPoolExecutor(len(queries)) as pool:
+        for fips in pool.map(lambda q: backend.list_floating_ips(**q),
+                             queries):
+            for fip in fips:
+                found[fip['id']] = fip
+    return list(found.values())
+
+
+def reap(cluster_name,
+         base_domain,
+         os_cloud,
+         backend=None,
+         max_workers=8) -> ReapResult:
+    """Delete all the floating ips of a cluster, max_workers at a time, the
+    ones coming from the floating ip pool are returned to it"""
+    backend = neutron.get_backend(os_cloud, backend)
+    result = ReapResult()
+    fips = find_floating_ips(backend, cluster_name, base_domain)
+    if not fips:
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        futures = {}
+        for fip in fips:
+            if fippool.is_pooled(fip):
+                future = pool.submit(fippool.release, backend, fip)
+                futures[future] = (fip['floating_ip_address'],
+                                   result.released)
+            else:
+                future = pool.submit(backend.delete_floating_ip,
+                                     fip['floating_ip_address'])
+                futures[future] = (fip['floating_ip_address'], result.deleted)
+        for future in concurrent.futures.as_completed(futures):
+            ip_addr, done = futures[future]
+            try:
+                future.result()
+                done.append(ip_addr)
+            except Exception as exception:  # pylint: disable=broad-except
+                result.failed[ip_addr] = str(exception)
+    return result
@@ -1,61 +1,177 @@
 """Module implements dns methods to work with route53 provider"""
+import os
+import threading
+
 import boto3
-import pprint
+
+# returns the client to use instead of a boto3 one, ie: a stand-in in the
+# tests or the benchmarks
+CLIENT_FACTORY = None
+
+_LOCK = threading.Lock()
+_CONNECTION = {}
+_ZONE_IDS = {}
 
 
 def _get_connection():
-    return boto3.client('route53')
+    """Returns the route53 client shared by the whole process, boto3 clients
+    are thread safe but should not be reused across a fork. The zone ids
+    looked up are forgotten with the client, ie: when CLIENT_FACTORY
+    changed."""
+    key = (os.getpid(), CLIENT_FACTORY)
+    with _LOCK:
+        if key not in _CONNECTION:
+            _CONNECTION.clear()
+            _ZONE_IDS.clear()
+            _CONNECTION[key] = (CLIENT_FACTORY()
+                                if CLIENT_FACTORY else boto3.client('route53'))
+        return _CONNECTION[key]
+
+
+def find_zone_ids(name: str) -> list:
+    """Returns the ids of the hosted zones called name, paginating through
+    the zones sorted by name and stopping as soon as we are past it"""
+    name = name.rstrip('.').lower() + '.'
+    client = _get_connection()
+    kwargs = {'DNSName': name}
+    result = []
+    while True:
+        ret = client.list_hosted_zones_by_name(**kwargs)
+        for zone in ret['HostedZones']:
+            if zone['Name'].lower() != name:
+                return result
+            result.append(zone['Id'])
+        if not ret['IsTruncated']:
+            return result
+        kwargs = {
+            'DNSName': ret['NextDNSName'],
+            'HostedZoneId': ret['NextHostedZoneId']
+        }
+
+
+def get_zone_id(name: str, cached: bool = True) -> str:
+    """Returns the id of the hosted zone called name, lookups are cached for
+    the life of the process"""
+    with _LOCK:
+        if cached and name in _ZONE_IDS:
+            return _ZONE_IDS[name]
+    result = find_zone_ids(name)
+    if len(result) == 0:
+        raise Exception(f"Could not find hosted zone for {name}")
+    if cached:
+        with _LOCK:
+            _ZONE_IDS[name] = result[0]
+    return result[0]
 
 
 class Route53Provider():
-    def __init__(self, cluster_name=None, base_domain=None, **kwargs):
+    def __init__(self,
+                 cluster_name=None,
+                 base_domain=None,
+                 ttl=3600,
+                 **kwargs):
         self.zone_id = None
         self.cluster_name = cluster_name
         self.base_domain = base_domain
-        self.ttl = 3600
+        self.ttl = ttl
+        self.api_ip = None
+        self.apps_ip = None
 
     def _get_hosted_zone(self):
         if self.zone_id is None:
-            zones = _get_connection().list_hosted_zones()['HostedZones']
-            result = [
-                v['Id'] for v in zones if v['Name'] == (self.base_domain + ".")
-            ]
-            if len(result) == 0:
-                raise Exception("Invalid number of results")
-            self.zone_id = result[0]
+            self.zone_id = get_zone_id(self.base_domain)
         return self.zone_id
 
-    def _execute_command(self, prefix: str, mode: str, ip_addr: str):
-        change_batch = {
-            'Changes': [{
-                'Action': mode,
-                'ResourceRecordSet': {
-                    'Name':
-                    '.'.join([prefix, self.cluster_name, self.base_domain]) +
-                    '.',
-                    'Type':
-                    'A',
-                    'TTL':
-                    self.ttl,
-                    'ResourceRecords': [{
-                        'Value': ip_addr
-                    }]
-                }
-            }]
+    def _change(self, prefix: str, mode: str, ip_addr: str):
+        return {
+            'Action': mode,
+            'ResourceRecordSet': {
+                'Name':
+                '.'.join([prefix, self.cluster_name, self.base_domain]) + '.',
+                'Type': 'A',
+                'TTL': self.ttl,
+                'ResourceRecords': [{
+                    'Value': ip_addr
+                }]
+            }
         }
-        _get_connection().change_resource_record_sets(
-            HostedZoneId=self._get_hosted_zone(), ChangeBatch=change_batch)
+
+    def _submit(self, changes: list) -> str:
+        ret = _get_connection().change_resource_record_sets(
+            HostedZoneId=self._get_hosted_zone(),
+            ChangeBatch={'Changes': changes})
+        return ret['ChangeInfo']['Id']
+
+    def _execute_command(self, prefix: str, mode: str, ip_addr: str):
+        return self._submit([self._change(prefix, mode, ip_addr)])
+
+    def wait(self, change_id: str, delay: int = 5, max_attempts: int = 60):
+        """Blocks until the change has been propagated to all route53 dns
+        servers"""
+        _get_connection().get_waiter('resource_record_sets_changed').wait(
+            Id=change_id,
+            WaiterConfig={
+                'Delay': delay,
+                'MaxAttempts': max_attempts
+            })
+
+    def get_domains(self) -> dict:
+        """Returns the addresses of the api and *.apps records, listing the
+        zone from the cluster name since route53 sorts records by reversed
+        labels"""
+        parent = f"{self.cluster_name}.{self.base_domain}.".lower()
+        names = {f"api.{parent}": 'api', f"*.apps.{parent}": '*.apps'}
+        result = {}
+        paginator = _get_connection().get_paginator(
+            'list_resource_record_sets')
+        for page in paginator.paginate(HostedZoneId=self._get_hosted_zone(),
+                                       StartRecordName=parent):
+            for record in page['ResourceRecordSets']:
+                name = record['Name'].replace('\\052', '*').lower()
+                if not name.endswith(parent):
+                    return result
+                if record['Type'] == 'A' and name in names:
+                    result[names[name]] = [
+                        v['Value'] for v in record.get('ResourceRecords', [])
+                    ]
+        return result
+
+    def add_domains(self,
+                    api_ip: str,
+                    apps_ip: str,
+                    wait: bool = False,
+                    only_changed: bool = False):
+        """Upsert the api and *.apps records in one change batch, when
+        only_changed is set nothing is sent if they already have these
+        addresses"""
+        self.api_ip = api_ip
+        self.apps_ip = apps_ip
+        if only_changed and self.get_domains() == {
+                'api': [api_ip],
+                '*.apps': [apps_ip]
+        }:
+            return None
+        change_id = self._submit([
+            self._change('api', 'UPSERT', api_ip),
+            self._change('*.apps', 'UPSERT', apps_ip),
+        ])
+        if wait:
+            self.wait(change_id)
+        return change_id
 
     def add_api_domain(self, ip_addr: str):
         self.api_ip = ip_addr
-        self._execute_command('api', 'CREATE', ip_addr)
+        return self._execute_command('api', 'CREATE', ip_addr)
 
     def add_apps_domain(self, ip_addr: str):
         self.apps_ip = ip_addr
-        self._execute_command('*.apps', 'CREATE', ip_addr)
+        return self._execute_command('*.apps', 'CREATE', ip_addr)
 
     def delete_domains(self):
+        changes = []
         if self.api_ip is not None:
-            self._execute_command('api', 'DELETE', self.api_ip)
+            changes.append(self._change('api', 'DELETE', self.api_ip))
         if self.apps_ip is not None:
-            self._execute_command('*.apps', 'DELETE', self.apps_ip)
+            changes.append(self._change('*.apps', 'DELETE', self.apps_ip))
+        if changes:
+            self._submit(changes)
@@ -0,0 +1,184 @@
+"""Module running several profiles at the same time in worker processes"""
+import multiprocessing
+import os
+import pathlib
+import sys
+import threading
+import time
+import traceback
+
+
+def _run_child(target, args, config, logfile):
+    logfile.parent.mkdir(parents=True, exist_ok=True)
+    output = logfile.open('a', buffering=1)
+    os.dup2(output.fileno(), sys.stdout.fileno())
+    os.dup2(output.fileno(), sys.stderr.fileno())
+    sys.stdout = sys.stderr = output
+    try:
+        target(args, config)
+    except SystemExit:
+        raise
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+        sys.exit(1)
+
+
+class Job():
+    """A profile to run, isolated in its own process and log file"""
+    def __init__(self, name, config, target, args):
+        self.name = name
+        self.config = config
+        self.target = target
+        self.args = args
+        self.logfile = pathlib.Path(
+            "installs") / config['clusterName'] / "moumoustall.log"
+        self.exitcode = None
+        self.elapsed = 0.0
+        self.rejected = None
+
+    def run(self):
+        context = multiprocessing.get_context("fork")
+        process = context.Process(target=_run_child,
+                                  args=(self.target, self.args, self.config,
+                                        self.logfile),
+                                  name=f"moumoustall-{self.name}")
+        start = time.monotonic()
+        process.start()
+        process.join()
+        self.elapsed = time.monotonic() - start
+        self.exitcode = process.exitcode
+        return self.exitcode == 0
+
+
+class Scheduler():
+    """Run jobs concurrently, capping how many run per config key.
+
+    limits is a dict of config key to the maximum number of jobs sharing the
+    same value for that key allowed to run at once, ie: {'osCloud': 2}. A
+    limit of 0 or None means no limit.
+
+    admit is an optional callable returning if a job can start now, a job it
+    refuses stays queued and is asked again every poll_interval seconds or
+    when another job finishes, an exception rejects the job. A job still
+    queued after queue_timeout seconds is rejected, unless it is 0 or None.
+    release is called with every admitted job once it is done.
+    """
+    def __init__(self,
+                 max_workers,
+                 limits=None,
+                 admit=None,
+                 release=None,
+                 poll_interval=30,
+                 queue_timeout=None):
+        self.max_workers = max_workers
+        self.limits = {k: v for k, v in (limits or {}).items() if v}
+        self.admit = admit
+        self.release = release
+        self.poll_interval = poll_interval
+        self.queue_timeout = queue_timeout
+        self._running = {}
+        self._queued = {}
+        self._cond = threading.Condition()
+
+    def _slots(self, job):
+        return [(key, job.config.get(key)) for key in self.limits]
+
+    def _fits(self, job):
+        for slot in self._slots(job):
+            if self._running.get(slot, 0) >= self.limits[slot[0]]:
+                return False
+        return True
+
+    def _admitted(self, job):
+        if self.admit is None or self.admit(job):
+            return True
+        if job.name not in self._queued:
+            self._queued[job.name] = time.monotonic()
+            print(f"⏸  {job.name} is queued until there is enough quota")
+        elif (self.queue_timeout and
+              time.monotonic() - self._queued[job.name] > self.queue_timeout):
+            raise Exception(
+                f"still not enough quota after {self.queue_timeout}s")
+        return False
+
+    def _take(self, pending):
+        with self._cond:
+            while pending:
+                for job in pending:
+                    if not self._fits(job):
+                        continue
+                    try:
+                        if not self._admitted(job):
+                            continue
+                    except Exception as exception:  # pylint: disable=broad-except
+                        job.rejected = exception
+                        pending.remove(job)
+                        return job
+                    pending.remove(job)
+                    for slot in self._slots(job):
+                        self._running[slot] = self._running.get(slot, 0) + 1
+                    return job
+                self._cond.wait(self.poll_interval if self.admit else None)
+            return None
+
+    def _release(self, job):
+        with self._cond:
+            for slot in self._slots(job):
+                self._running[slot] -= 1
+            if self.release:
+                self.release(job)
+            self._cond.notify_all()
+
+    def _worker(self, pending, results):
+        while True:
+            job = self._take(pending)
+            if job is None:
+                return
+            if job.rejected is not None:
+                results[job.name] = False
+                print(f"🚫 {job.name} cannot be installed: {job.rejected}")
+                continue
+            print(f"🚀 Starting {job.name}, logs are in {job.logfile}")
+            try:
+                results[job.name] = job.run()
+            finally:
+                self._release(job)
+            if results[job.name]:
+                print(f"✅ {job.name} finished in {job.elapsed:.0f}s")
+            else:
+                print(f"💥 {job.name} failed after {job.elapsed:.0f}s "
+                      f"with exit code {job.exitcode}, see {job.logfile}")
+
+    def run(self, jobs):
+        """Run all jobs and return a dict of job name to success"""
+        pending = list(jobs)
+        results = {}
+        threads = [
+            threading.Thread(target=self._worker, args=(pending, results))
+            for _ in range(min(self.max_workers, len(pending)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+
+def run_profiles(target,
+                 args,
+                 configs,
+                 max_workers,
+                 limits=None,
+                 admit=None,
+                 release=None,
+                 queue_timeout=None):
+    """Run target(args, config) for every profile in configs concurrently,
+    a failing profile doesn't stop the other ones. Returns the list of failed
+    profiles."""
+    jobs = [Job(name, config, target, args) for name, config in configs]
+    results = Scheduler(max_workers,
+                        limits,
+                        admit,
+                        release,
+                        queue_timeout=queue_timeout).run(jobs)
+    return [job.name for job in jobs if not results.get(job.name)]
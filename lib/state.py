@@ -0,0 +1,46 @@
+"""Module keeping a journal of the steps done for a cluster install, so a
+failed or interrupted install can be resumed instead of started again"""
+import json
+import pathlib
+import threading
+import time
+
+from lib import utils
+
+
+class InstallState():
+    def __init__(self, install_dir):
+        self.path = pathlib.Path(install_dir) / "moumoustall-state.json"
+        self._lock = threading.Lock()
+        try:
+            self.steps = json.loads(self.path.read_text())['steps']
+        except (OSError, ValueError, KeyError):
+            self.steps = {}
+
+    def _save(self):
+        # the rendered install-config has the pull secret
+        utils.write_atomic(self.path,
+                           json.dumps({'steps': self.steps}, indent=2),
+                           mode=0o600)
+
+    def exists(self):
+        return bool(self.steps)
+
+    def done(self, step):
+        return step in self.steps
+
+    def output(self, step):
+        return self.steps.get(step, {}).get('output')
+
+    def complete(self, step, output=None):
+        """Records step as done with its output, written to disk right away
+        so it survives a crash or a reboot"""
+        with self._lock:
+            self.steps[step] = {'time': time.time(), 'output': output}
+            self._save()
+
+    def reset(self):
+        with self._lock:
+            self.steps = {}
+            if self.path.exists():
+                self.path.unlink()
@@ -0,0 +1,209 @@
+"""Module finding and removing what clusters left behind across the fleet
+
+Everything is listed in one pass, the hosted zones of the clusters below
+every base domain, the api and apps records in the base domain zones, the
+floating ips of every cloud and the install directories, and matched in
+memory. A cluster nobody is installing anymore is an orphan and all its
+resources are removed, a few at a time.
+
+Only the clusters of the profiles or of the install directories on this
+machine are swept. The floating ips, DNS names and zones of other clusters
+sharing the project or the base domain, even the ones installed by
+moumoustall from another host, are left alone.
+"""
+import concurrent.futures
+import pathlib
+import re
+import time
+
+from lib import cleanup, fippool, neutron, route53
+
+# an install still running may not have its metadata.json yet
+GRACE = 6 * 3600
+
+DESCRIPTION_RE = re.compile(r"^cluster: (?P<cluster>[^ ]+) , ")
+
+
+class Orphan():
+    def __init__(self, cluster_name):
+        self.cluster_name = cluster_name
+        self.zones = []
+        self.records = []
+        self.floating_ips = []
+
+    def __repr__(self):
+        return (f"{self.cluster_name}: {len(self.zones)} zones, "
+                f"{len(self.records)} records, "
+                f"{len(self.floating_ips)} floating ips")
+
+
+class SweepResult():
+    def __init__(self):
+        self.orphans = {}
+        self.deleted = []
+        self.failed = {}
+
+    def orphan(self, cluster_name):
+        if cluster_name not in self.orphans:
+            self.orphans[cluster_name] = Orphan(cluster_name)
+        return self.orphans[cluster_name]
+
+
+def alive_clusters(installs="installs", grace=GRACE):
+    """Returns the clusters installed or being installed"""
+    alive = set()
+    if not pathlib.Path(installs).exists():
+        return alive
+    for directory in pathlib.Path(installs).iterdir():
+        if not directory.is_dir():
+            continue
+        if (directory / "metadata.json").exists():
+            alive.add(directory.name)
+            continue
+        journal = directory / "moumoustall-state.json"
+        if journal.exists() and time.time() - journal.stat().st_mtime < grace:
+            alive.add(directory.name)
+    return alive
+
+
+def list_zones():
+    """Returns all the hosted zones of the account"""
+    paginator = route53._get_connection().get_paginator('list_hosted_zones')
+    return [
+        zone for page in paginator.paginate() for zone in page['HostedZones']
+    ]
+
+
+def fip_cluster(fip):
+    """Returns the cluster a floating ip was created for, None for the free
+    ones of the pool or the ones we didn't create"""
+    for tag in fip['tags']:
+        if tag.startswith("moumoustall-cluster="):
+            return tag.split('=', 1)[1]
+    match = DESCRIPTION_RE.match(fip['description'] or "")
+    return match and match.group('cluster')
+
+
+def find(configs, installs="installs", grace=GRACE):
+    """Returns a SweepResult with the orphans found for all the profiles of
+    configs, a dict of profile name to config"""
+    result = SweepResult()
+    alive = alive_clusters(installs, grace)
+    known = {config['clusterName'] for config in configs.values()}
+    if pathlib.Path(installs).exists():
+        known |= {path.name for path in pathlib.Path(installs).iterdir()}
+
+    clouds = {
+        config['osCloud']: config.get('openstackBackend')
+        for config in configs.values()
+    }
+    domains = {config['baseDomain'].rstrip('.').lower()
+               for config in configs.values()}
+
+    with concurrent.futures.ThreadPoolExecutor(len(clouds) + 1) as pool:
+        fips = {
+            cloud: pool.submit(
+                neutron.get_backend(cloud, kind).list_floating_ips)
+            for cloud, kind in clouds.items()
+        }
+        zones = pool.submit(list_zones)
+
+        for cloud, future in fips.items():
+            for fip in future.result():
+                cluster_name = fip_cluster(fip)
+                if cluster_name in known and cluster_name not in alive:
+                    result.orphan(cluster_name).floating_ips.append(
+                        ((cloud, clouds[cloud]), fip))
+
+        zones = [(zone['Name'].rstrip('.').lower(), zone)
+                 for zone in zones.result()]
+
+    zone_ids = {}
+    for name, zone in zones:
+        zone_ids.setdefault(name, zone['Id'])
+        for domain in domains:
+            cluster_name = name[:-len(domain) - 1]
+            if (name.endswith('.' + domain) and '.' not in cluster_name
+                    and cluster_name in known
+                    and cluster_name not in alive):
+                result.orphan(cluster_name).zones.append(zone)
+
+    for domain in domains:
+        if domain not in zone_ids:
+            continue
+        zone_id = zone_ids[domain]
+        suffix = '.' + domain + '.'
+        for record in cleanup.list_record_sets(zone_id):
+            name = cleanup._normalize(record['Name'])
+            if record['Type'] != 'A' or not name.endswith(suffix):
+                continue
+            labels = name[:-len(suffix)].split('.')
+            if labels[0] == 'api' and len(labels) == 2:
+                cluster_name = labels[1]
+            elif labels[:2] == ['*', 'apps'] and len(labels) == 3:
+                cluster_name = labels[2]
+            else:
+                continue
+            if cluster_name in known and cluster_name not in alive:
+                result.orphan(cluster_name).records.append((zone_id, record))
+    return result
+
+
+def sweep(configs,
+          installs="installs",
+          dry_run=False,
+          max_workers=8,
+          grace=GRACE):
+    """Finds the orphans and removes them max_workers at a time, or only
+    reports them with dry_run"""
+    result = find(configs, installs, grace)
+    if dry_run:
+        return result
+
+    tasks = {}
+    records = {}
+    for orphan in result.orphans.values():
+        for zone in orphan.zones:
+            tasks[f"zone {zone['Name']} ({zone['Id']})"] = (
+                cleanup.delete_zone, zone['Id'])
+        for zone_id, record in orphan.records:
+            records.setdefault(zone_id, []).append(record)
+        for (os_cloud, kind), fip in orphan.floating_ips:
+            backend = neutron.get_backend(os_cloud, kind)
+            if fippool.is_pooled(fip):
+                tasks[f"floating ip {fip['floating_ip_address']}"] = (
+                    fippool.release, backend, fip)
+            else:
+                tasks[f"floating ip {fip['floating_ip_address']}"] = (
+                    backend.delete_floating_ip, fip['floating_ip_address'])
+    # all the records of a zone go in as few change batches as possible
+    for zone_id, zone_records in records.items():
+        tasks[f"{len(zone_records)} records in {zone_id}"] = (
+            cleanup.delete_record_sets, zone_id, zone_records)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        futures = {
+            pool.submit(*task): name
+            for name, task in tasks.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+                result.deleted.append(futures[future])
+            except Exception as exception:  # pylint: disable=broad-except
+                result.failed[futures[future]] = exception
+
+    # the released floating ips don't go over the size of their pool
+    pools = {(config['osCloud'], config['externalNetwork']): config
+             for config in configs.values()
+             if int(config.get('floatingIPPool') or 0)}
+    for (os_cloud, network), config in pools.items():
+        name = f"floating ip pool of {network} on {os_cloud}"
+        try:
+            for ip_addr in fippool.FloatingIPPool(
+                    os_cloud, network, int(config['floatingIPPool']),
+                    config.get('openstackBackend'), installs).trim():
+                result.deleted.append(f"floating ip {ip_addr} of the pool")
+        except Exception as exception:  # pylint: disable=broad-except
+            result.failed[name] = exception
+    return result
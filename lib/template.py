@@ -0,0 +1,118 @@
+"""Module rendering the install-config.yaml templates
+
+Templates are compiled once into a list of literal parts and variables, and
+cached until their file changes. The variables are known before rendering so
+all the profiles can be checked at once before any cloud resource is
+allocated.
+"""
+import pathlib
+import re
+import threading
+
+import yaml
+
+from lib import mirror
+
+VARIABLE_RE = re.compile(r"\{\{([_a-zA-Z0-9\.]*)\}\}")
+PLACEHOLDER_IP = "0.0.0.0"
+
+_CACHE = {}
+_LOCK = threading.Lock()
+
+
+class Template():
+    def __init__(self, text):
+        # odd indexes are the variable names
+        self.parts = VARIABLE_RE.split(text)
+        self.variables = set(self.parts[1::2])
+
+    def render(self, values):
+        missing = self.variables - set(values)
+        if missing:
+            raise Exception("Cannot replace " +
+                            ", ".join(f"{{{{{name}}}}}"
+                                      for name in sorted(missing)))
+        parts = list(self.parts)
+        parts[1::2] = [str(values[name]) for name in self.parts[1::2]]
+        return "".join(parts)
+
+
+def _cached(path, compile_func):
+    """Returns compile_func(text of path), compiled again only when the
+    file changed"""
+    path = pathlib.Path(path)
+    mtime = path.stat().st_mtime_ns
+    with _LOCK:
+        cached = _CACHE.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    value = compile_func(path.read_text())
+    with _LOCK:
+        _CACHE[path] = (mtime, value)
+    return value
+
+
+def template_path(config):
+    return pathlib.Path("config") / f"install-{config['template']}.yaml"
+
+
+def load(config):
+    path = template_path(config)
+    if not path.exists():
+        raise Exception(f"{path} doesnt exist")
+    return _cached(path, Template)
+
+
+def pull_secret(config):
+    return _cached(
+        pathlib.Path("config") / config['pullRequestJsonFile'], lambda x: x)
+
+
+def values(config, api_ip, apps_ip):
+    """Returns the values the template of config can use"""
+    result = dict(config)
+    result['lbFloatingIP'] = api_ip
+    result['ingressFloatingIP'] = apps_ip
+    if 'pullRequestJsonFile' in config:
+        result['pullSecret'] = pull_secret(config)
+    return result
+
+
+def render(config, api_ip, apps_ip):
+    rendered = load(config).render(values(config, api_ip, apps_ip))
+    if config.get('mirrorRegistry'):
+        trust_bundle = None
+        if config.get('mirrorTrustBundle'):
+            trust_bundle = _cached(
+                pathlib.Path("config") / config['mirrorTrustBundle'],
+                lambda x: x)
+        rendered = mirror.inject(rendered, config['mirrorRegistry'],
+                                 trust_bundle)
+    return rendered
+
+
+def validate(config):
+    """Renders the template of config with placeholder floating ips and
+    returns it, raises if a variable is missing or it's not valid yaml"""
+    rendered = render(config, PLACEHOLDER_IP, PLACEHOLDER_IP)
+    try:
+        yaml.safe_load(rendered)
+    except yaml.YAMLError as exception:
+        raise Exception(
+            f"{template_path(config)} is not valid yaml once rendered: "
+            f"{exception}") from exception
+    return rendered
+
+
+def render_all(configs):
+    """Validates the templates of all the profiles of configs, a dict of
+    profile name to config, returns the rendered templates and a dict of the
+    profiles which failed to their error"""
+    rendered = {}
+    errors = {}
+    for name, config in configs.items():
+        try:
+            rendered[name] = validate(config)
+        except Exception as exception:  # pylint: disable=broad-except
+            errors[name] = exception
+    return rendered, errors
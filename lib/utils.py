@@ -0,0 +1,50 @@
+"""Module with the helpers shared by the other modules: locks between
+processes, atomic writes and background threads"""
+import concurrent.futures
+import contextlib
+import fcntl
+import os
+import pathlib
+import threading
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Exclusive lock on path shared between threads and processes"""
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_atomic(path, text, mode=0o666):
+    """Writes text to path through a temporary file renamed over it so a
+    reader never sees half of it, mode is the permissions of the file before
+    the umask"""
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(
+        f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, 'w') as fp:
+        fp.write(text)
+    tmp.replace(path)
+
+
+def in_thread(func, *args):
+    """Runs func(*args) in a daemon thread, which doesn't hold the process
+    when it is stuck, and returns a future of its result"""
+    future = concurrent.futures.Future()
+
+    def run():
+        try:
+            future.set_result(func(*args))
+        except Exception as exception:  # pylint: disable=broad-except
+            future.set_exception(exception)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
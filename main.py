@@ -14,190 +14,421 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 import argparse
+import concurrent.futures
 import json
 import os
 import pathlib
-import re
-import subprocess
 import sys
 import yaml
 
-from lib import cleanup, downloader, route53
+# the modules talking to the clouds pull boto3, requests or openstacksdk,
+# they are imported by the commands using them to keep the startup fast
+from lib import (metrics, mirror, pipeline, progress, scheduler, state,
+                 template)
 
-
-def execute(command, check_error=""):
-    """Execute commmand"""
-    result = ""
-    try:
-        result = subprocess.run(["/bin/sh", "-c", command],
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT,
-                                check=True)
-    except subprocess.CalledProcessError as exception:
-        if check_error:
-            print(check_error)
-            print(
-                f"Status code: {exception.returncode}: Output: \n{exception.output}"
-            )
-            raise exception
-    return result
+# the libyaml loader is a lot faster when pyyaml has been built with it
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 
-def create_floating_ips(cluster_name, base_domain, os_cloud, external_network):
-    cmd = f"openstack --os-cloud {os_cloud} floating ip create -f json --description 'cluster: {cluster_name} , api.{cluster_name}.{base_domain}' {external_network}"
-    ret = execute(cmd, check_error=f"Error running {cmd}")
-    jeez = json.loads(ret.stdout)
-    apiip = jeez['floating_ip_address']
+def create_floating_ips(cluster_name, base_domain, os_cloud, external_network,
+                        backend=None):
+    from lib import neutron
 
-    cmd = f"openstack --os-cloud {os_cloud} floating ip create -f json --description 'cluster: {cluster_name} , *.apps.{cluster_name}.{base_domain}' {external_network}"
-    ret = execute(cmd, check_error=f"Error running {cmd}")
-    jeez = json.loads(ret.stdout)
-    appsip = jeez['floating_ip_address']
-
-    return {"api": apiip, "apps": appsip}
+    backend = neutron.get_backend(os_cloud, backend)
+    descriptions = neutron.descriptions(cluster_name, base_domain)
+    tags = [neutron.cluster_tag(cluster_name)]
+    with concurrent.futures.ThreadPoolExecutor(len(descriptions)) as pool:
+        futures = {
+            name: pool.submit(backend.create_floating_ip, external_network,
+                              description, tags)
+            for name, description in descriptions.items()
+        }
+    return {
+        name: future.result()['floating_ip_address']
+        for name, future in futures.items()
+    }
 
 
 def do_template(config, api_ip, apps_ip):
-    path = pathlib.Path("config") / f"install-{config['template']}.yaml"
-    if not path.exists():
-        raise Exception(f"{path} doesnt exist")
-
-    def tpl_apply(param):
-        if param == "lbFloatingIP":
-            return api_ip
-        elif param == "ingressFloatingIP":
-            return apps_ip
-        elif param == "pullSecret":
-            return open(f"./config/{config['pullRequestJsonFile']}",
-                        'r').read()
-        elif param in config:
-            return config[param]
-        raise Exception(f"Cannot replace {{{param}}} variable")
-
-    return re.sub(
-        r"\{\{([_a-zA-Z0-9\.]*)\}\}",
-        lambda m: tpl_apply(m.group(1)),
-        path.read_text(),
-    )
+    return template.render(config, api_ip, apps_ip)
+
 
+def post_install_tasks(config, install_dir, apps_ip, certs=None):
+    from lib import certstore, kube, neutron, postinstall
 
-def post_install_tasks(config, install_dir, apps_ip):
     authjson = pathlib.Path(install_dir) / "metadata.json"
     authjson = json.load(authjson.open())
+    client = kube.Client(pathlib.Path(install_dir) / "auth" / "kubeconfig")
 
-    if 'htpasswd' in config:
+    def htpasswd():
         print(f"👪  Creating extras users from config/{config['htpasswd']}")
-        os.system(
-            f"bash scripts/add-oauth-htpasswd.sh {install_dir}/auth/kubeconfig config/{config['htpasswd']} >/dev/null"
-        )
-
+        postinstall.add_htpasswd(client,
+                                 pathlib.Path("config") / config['htpasswd'])
+
+    def only_masters():
+        print("🌆 Scaling down clusters to only masters")
+        postinstall.scale_to_masters(client)
+
+    def floating_ip():
+        infraID = authjson['infraID']
+        print(f"🌸 Assigning floating ip for {infraID}-ingress-port")
+        neutron.get_backend(config['osCloud'],
+                            config.get('openstackBackend')).set_floating_ip_port(
+                                apps_ip, f"{infraID}-ingress-port")
+
+    def router_certs():
+        print("🗽 Installing letsencrypt certs for router")
+        certstore.CertStore().push(client, config['clusterName'],
+                                   config['baseDomain'], certs)
+
+    steps = [pipeline.Step("floating-ip", floating_ip)]
+    if 'htpasswd' in config:
+        steps.append(pipeline.Step("htpasswd", htpasswd))
     if 'onlyMasters' in config and config['onlyMasters']:
-        print(f"🌆 Scaling down clusters to only masters")
-        os.system(
-            f"bash scripts/scale-to-three-node.sh {install_dir}/auth/kubeconfig >/dev/null"
-        )
+        steps.append(pipeline.Step("only-masters", only_masters))
+    if certs is not None:
+        steps.append(pipeline.Step("certs", router_certs))
+
+    with client:
+        results = pipeline.run(steps)
+    for result in results.values():
+        print(f"{'🎁' if result.ok else '💥'} Post install {result}")
+    failed = pipeline.failures(results)
+    if failed:
+        raise Exception("Post install failed for: " +
+                        ", ".join(result.name for result in failed))
+
+
+def manifest_certs(install_binary, install_dir, config):
+    """Adds the stored router certificate of the cluster to its manifests,
+    returns False if there is none and it has to be pushed after the
+    install"""
+    from lib import certstore
+
+    store = certstore.CertStore()
+    if not store.lookup(config['clusterName'], config['baseDomain']):
+        return False
+    print("🗽 Adding letsencrypt certs for router to the manifests")
+    ret = os.system(
+        f"{install_binary} create manifests --dir={install_dir} --log-level=info"
+    )
+    if ret != 0:
+        raise Exception("Failure to create the manifests")
+    return store.write_manifests(install_dir, config['clusterName'],
+                                 config['baseDomain'])
+
+
+def get_pool(config):
+    if not ('floatingIPPool' in config and int(config['floatingIPPool'])):
+        return None
+    from lib import fippool
+    return fippool.FloatingIPPool(config['osCloud'], config['externalNetwork'],
+                                  int(config['floatingIPPool']),
+                                  config.get('openstackBackend'))
+
+
+def get_admission(configs, rendered, uninstall=False):
+    """Returns the admit and release callbacks for the scheduler, checking
+    the footprint of each cluster against the quota left on its osCloud.
+    configs and rendered are dicts of profile name to its config and its
+    rendered install-config, with uninstall a cluster being reinstalled
+    doesn't count the servers it is about to delete"""
+    from lib import admission
+
+    controller = admission.AdmissionController(
+        backends={
+            config['osCloud']: config.get('openstackBackend')
+            for config in configs.values()
+        })
+    footprints = {}
+    credits = {}
+    for profile, config in configs.items():
+        footprints[profile] = controller.footprint(
+            config['osCloud'],
+            rendered[profile],
+            floating_ips=0 if config.get('floatingIPPool') else 2)
+        installed = pathlib.Path(
+            "installs") / config['clusterName'] / "metadata.json"
+        if uninstall and installed.exists():
+            # the install-config of the current cluster is gone, assume it
+            # was installed with the same one
+            credits[profile] = footprints[profile]
+
+    def admit(job):
+        return controller.admit(job.name, job.config['osCloud'],
+                                footprints[job.name], credits.get(job.name))
+
+    def release(job):
+        controller.release(job.name)
+
+    return admit, release
+
+
+def uninstall_cluster(config, install_binary, keep_records=False):
+    from lib import cleanup, reaper
 
-    infraID = authjson['infraID']
-    print(f"🌸 Assigning floating ip for {infraID}-ingress-port")
-    cmd = f"openstack --os-cloud {config['osCloud']} floating ip set --port {infraID}-ingress-port {apps_ip}"
-    execute(cmd, check_error=f"Error running {cmd}")
+    install_dir = pathlib.Path("installs") / config['clusterName']
+    fqdn = f"{config['clusterName']}.{config['baseDomain']}"
+
+    def destroy():
+        ret = os.system(f"{install_binary} destroy cluster --dir={install_dir}")
+        if ret != 0:
+            raise Exception("Failure to destroy cluster")
+
+    def dns():
+        cleanup.cleanup_dns_names(config['clusterName'],
+                                  config['baseDomain'],
+                                  silent=True,
+                                  records=not keep_records)
+
+    def floating_ips():
+        result = reaper.reap(config['clusterName'], config['baseDomain'],
+                             config['osCloud'],
+                             config.get('openstackBackend'))
+        for ip_addr in result.deleted:
+            print(f"• Removed floating IP: {ip_addr}")
+        for ip_addr in result.released:
+            print(f"• Returned floating IP to the pool: {ip_addr}")
+        if result.failed:
+            raise Exception("Could not cleanup floating ips: " +
+                            ", ".join(result.failed))
 
-    if os.path.exists(os.path.expanduser("~/.acme.sh/acme.sh")):
-        print(f"🗽 Creating letsencrypt certs for router")
-        os.system(
-            f"bash scripts/install-router-cert.sh {authjson['clusterName']} >/dev/null"
+    print(
+        f"⚰️  Cleaning old cluster resources, DNS names and floating IPS for {fqdn}"
+    )
+    results = pipeline.run([
+        pipeline.Step("destroy", destroy),
+        pipeline.Step("dns", dns),
+        pipeline.Step("floating-ips", floating_ips),
+    ])
+    for result in results.values():
+        print(f"{'🧹' if result.ok else '💥'} Uninstall {result}")
+    failed = pipeline.failures(results)
+    if failed:
+        raise Exception(
+            f"Failure to uninstall {fqdn}: {', '.join(r.name for r in failed)}"
         )
 
 
-def uninstall_cluster(config, install_binary):
-    install_dir = pathlib.Path("installs") / config['clusterName']
-    print("⚰️  Cleaning old cluster resources")
-    ret = os.system(f"{install_binary} destroy cluster --dir={install_dir}")
-    if ret != 0:
-        raise Exception("Failure to destroy cluster")
+def get_install_binary(config, offline=False):
+    from lib import downloader
 
     print(
-        f"🧹 Cleaning old DNS names for {config['clusterName']}.{config['baseDomain']}"
+        f"🌊 Downloading openshift installer for version {config['installerVersion'].replace('latest-', '')}"
     )
-    cleanup.cleanup_dns_names(config['clusterName'],
-                              config['baseDomain'],
-                              silent=True)
+    binaries_dir = pathlib.Path("binaries")
+    binaries_dir.mkdir(parents=True, mode=0o755, exist_ok=True)
+    installer_channel = "installer_channel" in config and config[
+        'installer_channel'] or 'prod'
+    return downloader.download_installer(config["installerVersion"],
+                                         binaries_dir,
+                                         source=installer_channel,
+                                         offline=offline,
+                                         devel_timeout=float(
+                                             config.get(
+                                                 'develTimeout',
+                                                 downloader.DEVEL_TIMEOUT)))
 
-    print(
-        f"🔱 Cleaning floating IPS for cluster {config['clusterName']}.{config['baseDomain']}"
-    )
-    ret = os.system(
-        f"bash ./scripts/remove-floating-ips.sh {config['clusterName']} {config['osCloud']}"
-    )
-    if ret != 0:
-        raise Exception("Could not cleanup floating ips.")
+
+def uninstall_profile(args, config):
+    # make sure this is unset
+    os.environ["OS_CLOUD"] = ""
+    install_dir = pathlib.Path("installs/") / config['clusterName']
+    if not (install_dir / "metadata.json").exists():
+        print(f"🙈 {config['clusterName']} is not installed, skipping")
+        return
+    uninstall_cluster(config, get_install_binary(config, args.offline))
+    pool = get_pool(config)
+    if pool:
+        for ip_addr in pool.trim():
+            print(f"• Removed floating IP from the pool: {ip_addr}")
+
+
+def wait_for_install(install_binary, install_dir, install_state, retries):
+    """Wait for an install which was already launched to finish, retrying
+    each phase up to retries times"""
+    phases = [
+        ("bootstrap-complete", "wait-for bootstrap-complete"),
+        ("bootstrap-destroyed", "destroy bootstrap"),
+        ("install-complete", "wait-for install-complete"),
+    ]
+    for name, command in phases:
+        if install_state.done(name):
+            continue
+        print(f"⏳ Running {command} in {install_dir}")
+        for attempt in range(retries + 1):
+            ret = os.system(
+                f"{install_binary} {command} --dir={install_dir} --log-level=info"
+            )
+            if ret == 0:
+                break
+            if attempt < retries:
+                print(f"🔁 {command} failed, retrying ({attempt + 1}/{retries})")
+        else:
+            return False
+        install_state.complete(name)
+    return True
 
 
 def doprofile(args, config):
+    from lib import certstore, cleanup, route53
+
     # make sure this is unset
     os.environ["OS_CLOUD"] = ""
     install_dir = pathlib.Path("installs/") / config['clusterName']
-    print(
-        f"🌊 Downloading openshift installer for version {config['installerVersion'].replace('latest-', '')}"
-    )
-    binaries_dir = pathlib.Path("binaries")
-    if not binaries_dir.exists():
-        binaries_dir.mkdir(parents=True, mode=0o755)
-    installer_channel = "installer_channel" in config and config[
-        'installer_channel'] or 'prod'
-    install_binary = downloader.download_installer(config["installerVersion"],
-                                                   binaries_dir,
-                                                   source=installer_channel)
-    if (install_dir / "metadata.json").exists():
+    recorder = metrics.Recorder(config['clusterName'],
+                                install_dir / "events.jsonl",
+                                args.metrics_dir)
+    install_state = state.InstallState(install_dir)
+    resume = args.resume and install_state.exists()
+
+    def step(name, func):
+        if resume and install_state.done(name):
+            print(f"⏭  Skipping {name}, already done")
+            return install_state.output(name)
+        with recorder.step(name):
+            output = func()
+        install_state.complete(name, output)
+        return output
+
+    recorder.event("profile_start", resume=resume)
+    with recorder.step("download"):
+        install_binary = get_install_binary(config, args.offline)
+    prewarm = None
+    if config.get('mirrorRegistry') and not args.no_install:
+        # mirrored while the floating ips and the dns are created
+        print(f"🪞 Mirroring the release to {config['mirrorRegistry']}")
+        prewarm = mirror.start_prewarm(
+            install_binary, config['mirrorRegistry'],
+            pathlib.Path("config") / config['pullRequestJsonFile'])
+    pool = get_pool(config)
+    # with a pool the cluster gets its floating ips back and we can keep its
+    # dns records when reinstalling
+    keep_records = pool is not None and not args.no_install
+    if resume:
+        print(f"♻️  Resuming install of {config['clusterName']}")
+    elif (install_dir / "metadata.json").exists():
         if args.uninstall:
-            uninstall_cluster(config, install_binary)
+            with recorder.step("uninstall"):
+                uninstall_cluster(config, install_binary, keep_records)
         else:
             raise Exception(f"{str(install_dir)} exists already")
+    if not resume:
+        install_state.reset()
 
     if not install_dir.exists():
         install_dir.mkdir(parents=True, mode=0o755)
 
-    cleanup.cleanup_dns_names(config['clusterName'],
-                              config['baseDomain'],
-                              silent=True)
+    step(
+        "cleanup", lambda: cleanup.cleanup_dns_names(config['clusterName'],
+                                                     config['baseDomain'],
+                                                     silent=True,
+                                                     records=not keep_records))
     if args.no_install:
         return
 
-    print(
-        f"🛢  Creating Floating IPS for {config['clusterName']}.{config['baseDomain']}"
-    )
-    ips = create_floating_ips(config['clusterName'], config['baseDomain'],
-                              config['osCloud'], config['externalNetwork'])
-
-    print(
-        f"🎛  Creating DNS for {config['clusterName']}.{config['baseDomain']} with {ips['api']} and {ips['apps']}"
-    )
-    dns = route53.Route53Provider(config['clusterName'], config['baseDomain'])
-    dns.add_api_domain(ips['api'])
-    dns.add_apps_domain(ips['apps'])
-
-    print(f"🧶 Generating install-config.yaml in {install_dir}")
-    processed = install_dir / "install-config.yaml"
-    processed.write_text(do_template(config, ips["api"], ips["apps"]))
+    def floating_ips():
+        if pool:
+            print(
+                f"🎱 Leasing Floating IPS for {config['clusterName']}.{config['baseDomain']} from the pool"
+            )
+            return pool.lease(config['clusterName'], config['baseDomain'])
+        print(
+            f"🛢  Creating Floating IPS for {config['clusterName']}.{config['baseDomain']}"
+        )
+        return create_floating_ips(config['clusterName'],
+                                   config['baseDomain'], config['osCloud'],
+                                   config['externalNetwork'],
+                                   config.get('openstackBackend'))
+
+    ips = step("floating-ips", floating_ips)
+    if pool:
+        pool.start_replenisher()
+
+    def dns():
+        print(
+            f"🎛  Creating DNS for {config['clusterName']}.{config['baseDomain']} with {ips['api']} and {ips['apps']}"
+        )
+        route53.Route53Provider(config['clusterName'],
+                                config['baseDomain']).add_domains(
+                                    ips['api'],
+                                    ips['apps'],
+                                    wait='waitForDNS' in config
+                                    and config['waitForDNS'],
+                                    only_changed=keep_records)
+
+    step("dns", dns)
+
+    def template():
+        print(f"🧶 Generating install-config.yaml in {install_dir}")
+        return do_template(config, ips["api"], ips["apps"])
+
+    rendered = step("template", template)
+
+    certs = None
+    if certstore.available() and not args.post_install_script:
+        # the certificate only needs the DNS, get it while installing
+        certs = certstore.CertStore().prepare(config['clusterName'],
+                                              config['baseDomain'])
+
+    if prewarm:
+        step("mirror", prewarm.result)
+
+    if not (resume and install_state.done("create-cluster")):
+        with recorder.step("create-cluster"):
+            launched = resume and (install_dir / "metadata.json").exists()
+            ret = 0
+            if not launched:
+                # the installer consumes install-config.yaml
+                (install_dir / "install-config.yaml").write_text(rendered)
+                if certs and manifest_certs(install_binary, install_dir,
+                                            config):
+                    # the cluster is installed with them, nothing to push
+                    certs = None
+                print(
+                    f"🧨 Launching installer in {install_dir}, tail -f installs/{config['clusterName']}/.openshift_install.log for giggles 🙊"
+                )
+                with recorder.follow_installer(install_dir) as log:
+                    ret = os.system(
+                        f"{install_binary} create cluster --dir={install_dir} --log-level=info"
+                    )
+                # a failed install may have gone far enough to not have to
+                # wait for the bootstrap again
+                if ret == 0 or "bootstrap-complete" in log.phases:
+                    install_state.complete("bootstrap-complete")
+                if ret == 0 or "cluster" in log.phases:
+                    install_state.complete("bootstrap-destroyed")
+                if ret == 0:
+                    install_state.complete("install-complete")
+            if ret != 0 or launched:
+                if not (install_dir / "metadata.json").exists() or (
+                        not launched and not args.retries):
+                    print("👊 It's up to you to debug why it failed!!")
+                    sys.exit(1)
+                if not wait_for_install(install_binary, install_dir,
+                                        install_state, args.retries):
+                    print(
+                        "👊 It's up to you to debug why it failed!! You can try again with --resume"
+                    )
+                    sys.exit(1)
+        install_state.complete("create-cluster")
+
+    def post_install():
+        if args.post_install_script:
+            os.system(args.post_install_script)
+        else:
+            post_install_tasks(
+                config,
+                f"installs/{config['clusterName']}",
+                ips["apps"],
+                certs,
+            )
 
-    print(
-        f"🧨 Launching installer in {install_dir}, tail -f installs/{config['clusterName']}/.openshift_install.log for giggles 🙊"
-    )
-    ret = os.system(
-        f"{install_binary} create cluster --dir={install_dir} --log-level=info"
-    )
-    if ret != 0:
-        print("👊 It's up to you to debug why it failed!!")
-        sys.exit(1)
+    step("post-install", post_install)
 
-    if args.post_install_script:
-        os.system(args.post_install_script)
-    else:
-        post_install_tasks(
-            config,
-            f"installs/{config['clusterName']}",
-            ips["apps"],
-        )
+    if pool:
+        pool.stop_replenisher()
+    recorder.event("profile_end")
 
 
 def main():
@@ -207,18 +438,75 @@ def main():
                         help="Uninstall profile if it's here already",
                         action="store_true",
                         default=False)
+    parser.add_argument(
+        "--uninstall-only",
+        help="Only uninstall the profiles, all of them at the same time "
+        "unless --parallel is specified",
+        action="store_true",
+        default=False)
     parser.add_argument(
         "--no-install",
         "-N",
         help="Do not install, combined to -u you will do just an uninstall",
         action="store_true",
         default=False)
+    parser.add_argument(
+        "--offline",
+        help="Resolve installer versions only from the local index and the "
+        "already downloaded binaries, without asking the mirrors",
+        action="store_true",
+        default=False)
+    parser.add_argument(
+        "--prefetch",
+        help="Download the installers of all the profiles in parallel before "
+        "starting, without profiles only prefetch for every profile",
+        action="store_true",
+        default=False)
+    parser.add_argument(
+        "--metrics-dir",
+        help="Directory where to write the step durations for the "
+        "prometheus node exporter textfile collector")
+    parser.add_argument(
+        "--resume",
+        help="Resume an install which failed or was interrupted, skipping "
+        "the steps already done",
+        action="store_true",
+        default=False)
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="When the installer fails, retry waiting for the bootstrap and "
+        "install to complete up to this many times, 2 by default, 0 to not "
+        "retry")
     parser.add_argument("--list-profiles",
                         "-L",
                         help="List all profiles available",
                         action="store_true",
                         default=False)
 
+    parser.add_argument(
+        "--status",
+        "-S",
+        action="store_true",
+        default=False,
+        help="Check the health of the clusters of the profiles, or of all "
+        "the profiles")
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        default=False,
+        help="Only check the install-config templates of the profiles render")
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        default=False,
+        help="Remove the DNS zones, records and floating IPs left behind by "
+        "the clusters of all the profiles which are not installed anymore")
+    parser.add_argument("--dry-run",
+                        action="store_true",
+                        default=False,
+                        help="With --sweep, only show what would be removed")
     parser.add_argument("--config-file",
                         default="./config/config.yaml",
                         help="path to config file with profiles")
@@ -231,10 +519,52 @@ def main():
                         help="Run for all profiles",
                         action="store_true",
                         default=False)
+    parser.add_argument(
+        "--parallel",
+        "-P",
+        type=int,
+        default=0,
+        help="Run up to N profiles at the same time in separate processes")
+    parser.add_argument(
+        "--max-per-cloud",
+        type=int,
+        default=0,
+        help="With --parallel, max profiles running on the same osCloud")
+    parser.add_argument(
+        "--max-per-domain",
+        type=int,
+        default=0,
+        help="With --parallel, max profiles running on the same baseDomain")
+    parser.add_argument(
+        "--queue-by-resources",
+        "-Q",
+        action="store_true",
+        default=False,
+        help="Only start an install when its osCloud has enough quota left "
+        "for it, waiting for other installs to finish otherwise")
+    parser.add_argument(
+        "--queue-timeout",
+        type=int,
+        default=3600,
+        help="With --queue-by-resources, fail an install still waiting for "
+        "quota after this many seconds, 0 to wait forever")
+    parser.add_argument(
+        "--watch",
+        "-W",
+        action="store_true",
+        default=False,
+        help="Show the progress of the installs of the profiles, or of all "
+        "the installs, until they are finished")
+    parser.add_argument("--json",
+                        action="store_true",
+                        default=False,
+                        help="With --watch, print a JSON line every time an "
+                        "install changes instead of a live view")
     parser.add_argument("profiles", nargs="*")
     args = parser.parse_args(sys.argv[1:])
 
-    CONFIG = yaml.safe_load(open(args.config_file, 'r'))
+    with open(args.config_file, 'r') as config_file:
+        CONFIG = yaml.load(config_file, Loader=YAML_LOADER)
 
     if args.list_profiles:
         print("Profiles available:")
@@ -248,7 +578,64 @@ def main():
             print("%-10s%-10s" % (profile, installed))
         sys.exit(0)
 
-    if args.all_profiles:
+    if args.sweep:
+        from lib import sweeper
+        result = sweeper.sweep(CONFIG, dry_run=args.dry_run)
+        for orphan in result.orphans.values():
+            print(f"👻 Orphan {orphan}")
+        for name in result.deleted:
+            print(f"🧹 Removed {name}")
+        for name, exception in result.failed.items():
+            print(f"💥 Could not remove {name}: {exception}")
+        if not result.orphans:
+            print("✨ Nothing to sweep")
+        sys.exit(1 if result.failed else 0)
+
+    if args.status:
+        from lib import health
+        names = args.profiles or CONFIG.keys()
+        unhealthy = False
+        for profile, result in health.status(
+            {name: CONFIG[name]
+             for name in names}).items():
+            if not result['installed']:
+                print("%-10s%-10s" % (profile, "Not installed"))
+                continue
+            probes = result['probes']
+            unhealthy = unhealthy or not all(p['ok'] for p in probes.values())
+            print("%-10s%s" % (profile, "  ".join(
+                f"{'✅' if probe['ok'] else '❌'} {name}"
+                for name, probe in probes.items())))
+            for name, probe in probes.items():
+                if not probe['ok']:
+                    print(f"          • {name}: {probe['detail']}")
+        sys.exit(1 if unhealthy else 0)
+
+    if args.watch:
+        if args.profiles or args.all_profiles:
+            names = args.profiles or CONFIG.keys()
+            dirs = [
+                pathlib.Path("installs") / CONFIG[name]['clusterName']
+                for name in names
+            ]
+            # the profiles not being installed have no log to follow
+            install_dirs = lambda: [
+                path for path in dirs
+                if (path / ".openshift_install.log").exists()
+            ]
+        else:
+            install_dirs = lambda: [
+                path.parent
+                for path in pathlib.Path("installs").glob(
+                    "*/.openshift_install.log")
+            ]
+        statuses = progress.watch(install_dirs, json_output=args.json)
+        if not statuses and not args.json:
+            print("✨ No install to watch")
+        sys.exit(1 if any(status['failed'] or status['interrupted']
+                          for status in statuses) else 0)
+
+    if args.all_profiles or (args.prefetch and not args.profiles):
         profiles = CONFIG.keys()
     elif not args.profiles:
         print("Missing profile as argument")
@@ -260,8 +647,59 @@ def main():
     for profile in profiles:
         if profile not in CONFIG:
             raise Exception(f"Profile: {profile} is not in config")
-        config = CONFIG[profile]
-        doprofile(args, config)
+
+    if args.prefetch:
+        from lib import prefetch
+        report = prefetch.prefetch([CONFIG[profile] for profile in profiles],
+                                   offline=args.offline)
+        print(f"📦 Prefetched installers: {report}")
+        for spec, exception in report.failed.items():
+            print(f"💥 Could not prefetch {spec}: {exception}")
+        if report.failed:
+            sys.exit(1)
+        if not args.profiles and not args.all_profiles:
+            sys.exit(0)
+
+    configs = {profile: CONFIG[profile] for profile in profiles}
+    if args.validate or not (args.uninstall_only or args.no_install):
+        # check all the templates before allocating anything in the clouds
+        rendered, errors = template.render_all(configs)
+        for profile, exception in errors.items():
+            print(f"💥 Invalid template for {profile}: {exception}")
+        if errors:
+            sys.exit(1)
+        if args.validate:
+            print(f"✅ Templates of {', '.join(rendered)} are valid")
+            sys.exit(0)
+
+    target = doprofile
+    admit = release = None
+    if args.uninstall_only:
+        target = uninstall_profile
+        args.parallel = args.parallel or len(profiles)
+    elif args.queue_by_resources and not args.no_install:
+        admit, release = get_admission(configs, rendered, args.uninstall)
+        args.parallel = args.parallel or 1
+
+    if args.parallel:
+        failed = scheduler.run_profiles(
+            target,
+            args, list(configs.items()),
+            args.parallel,
+            limits={
+                'osCloud': args.max_per_cloud,
+                'baseDomain': args.max_per_domain
+            },
+            admit=admit,
+            release=release,
+            queue_timeout=args.queue_timeout)
+        if failed:
+            print(f"👊 Failed profiles: {', '.join(failed)}")
+            sys.exit(1)
+        return
+
+    for profile in profiles:
+        doprofile(args, CONFIG[profile])
 
 
 if __name__ == "__main__":
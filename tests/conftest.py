@@ -0,0 +1,44 @@
+"""Fixtures shared by the tests, every test runs in its own empty directory
+with empty fake clouds, the stand-ins of bench/standins.py are started by
+the tests asking for them"""
+import pathlib
+import sys
+import types
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "bench")]
+
+# pylint: disable=wrong-import-position
+import standins  # noqa: E402
+from lib import downloader, neutron, route53  # noqa: E402
+
+BASE_DOMAIN = "example.com"
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(neutron.FakeBackend, "clouds", {})
+    monkeypatch.setattr(neutron.FakeBackend, "quotas", {})
+    monkeypatch.setattr(neutron.FakeBackend, "flavors", {})
+    monkeypatch.setattr(neutron.FakeBackend, "on_call", None)
+    monkeypatch.setattr(route53, "CLIENT_FACTORY", None)
+    return tmp_path
+
+
+@pytest.fixture
+def stand_ins(workdir, monkeypatch):
+    """The installer mirror, Kubernetes API, route53, acme.sh and
+    openshift-install stand-ins, with the calls made to them"""
+    for name in ("ACME_SH", "FAKE_KUBECONFIG", "FAKE_CALLS",
+                 "FAKE_INSTALLER_DELAY", "OS_CLOUD"):
+        monkeypatch.delenv(name, raising=False)
+    calls = standins.Calls(workdir / "calls")
+    server = standins.Server(calls, downloader._current_platform())
+    monkeypatch.setitem(downloader.SOURCES, 'prod', server.url + "/ocp/")
+    standins.install(calls, server, BASE_DOMAIN, workdir)
+    monkeypatch.setenv("FAKE_INSTALLER_DELAY", "0")
+    yield types.SimpleNamespace(calls=calls, server=server)
+    server.close()
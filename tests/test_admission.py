@@ -0,0 +1,100 @@
+import pathlib
+
+import pytest
+
+from lib import admission, neutron, scheduler
+
+INSTALL_CONFIG = """
+compute:
+- name: worker
+  replicas: 2
+controlPlane:
+  name: master
+  replicas: 3
+platform:
+  openstack:
+    computeFlavor: m1.large
+"""
+
+
+def _quota(cores, used=0):
+    neutron.FakeBackend.quotas['cloud'] = {'cores': (cores, used)}
+
+
+def _controller():
+    return admission.AdmissionController(backends={'cloud': 'fake'})
+
+
+def _footprint(cores):
+    return dict(dict.fromkeys(admission.RESOURCES, 0), cores=cores)
+
+
+def test_estimate_counts_the_bootstrap():
+    neutron.FakeBackend.flavors['m1.large'] = {'vcpus': 4, 'ram': 8192}
+
+    footprint = _controller().footprint('cloud', INSTALL_CONFIG)
+
+    assert footprint == {
+        'cores': 4 * 6,
+        'ram': 8192 * 6,
+        'instances': 6,
+        'floating_ips': 2
+    }
+
+
+def test_queued_until_released():
+    _quota(40)
+    controller = _controller()
+
+    assert controller.admit("first", 'cloud', _footprint(30))
+    assert not controller.admit("second", 'cloud', _footprint(20))
+    controller.release("first")
+    assert controller.admit("second", 'cloud', _footprint(20))
+
+
+def test_credit_of_a_reinstall():
+    _quota(40, used=30)
+    controller = _controller()
+
+    assert not controller.admit("reinstall", 'cloud', _footprint(30))
+    assert controller.admit("reinstall", 'cloud', _footprint(30),
+                            credit=_footprint(30))
+
+
+def test_bigger_than_the_quota():
+    _quota(40)
+
+    with pytest.raises(Exception, match="needs 50 cores"):
+        _controller().admit("big", 'cloud', _footprint(50))
+
+
+def run_profile(args, config):
+    pathlib.Path(f"done-{config['clusterName']}").touch()
+
+
+def test_scheduler_waits_for_quota():
+    _quota(40)
+    controller = _controller()
+    configs = [(name, {'clusterName': name, 'osCloud': 'cloud'})
+               for name in ("first", "second")]
+
+    failed = scheduler.run_profiles(
+        run_profile, None, configs, 2,
+        admit=lambda job: controller.admit(job.name, 'cloud', _footprint(30)),
+        release=lambda job: controller.release(job.name))
+
+    assert failed == []
+    assert pathlib.Path("done-second").exists()
+
+
+def test_scheduler_queue_timeout():
+    job = scheduler.Job("queued", {'clusterName': "queued"}, run_profile, None)
+
+    results = scheduler.Scheduler(1,
+                                  admit=lambda job: False,
+                                  poll_interval=0.05,
+                                  queue_timeout=0.2).run([job])
+
+    assert results == {"queued": False}
+    assert "not enough quota after 0.2s" in str(job.rejected)
+    assert not pathlib.Path("done-queued").exists()
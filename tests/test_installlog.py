@@ -0,0 +1,60 @@
+from lib import installlog
+
+
+def _line(msg, level="info", second=0):
+    return f'time="2020-07-01T10:00:{second:02d}Z" level={level} msg="{msg}"\n'
+
+
+def _append(workdir, *lines):
+    with (workdir / ".openshift_install.log").open("a") as fp:
+        fp.write("".join(lines))
+
+
+def test_parse_line():
+    when, level, msg = installlog.parse_line(
+        _line('Waiting for \\"the cluster\\"', level="debug"))
+
+    assert when.isoformat() == "2020-07-01T10:00:00+00:00"
+    assert level == "debug"
+    assert msg == 'Waiting for "the cluster"'
+    assert installlog.parse_line("not a log line") is None
+
+
+def test_phases_are_read_incrementally(workdir):
+    log = installlog.InstallLog(workdir)
+    _append(workdir, _line("Consuming Install Config from target directory",
+                           level="debug"),
+            _line("Creating infrastructure resources..."),
+            _line("Waiting up to 20m0s for the Kubernetes API at "
+                  "https://api:6443...", second=10))
+
+    assert [name for name, _ in log.poll()] == ["infrastructure", "api"]
+    assert log.poll() == []
+
+    # a partial line is only read once it is complete
+    _append(workdir, _line("Waiting up to 40m0s for bootstrapping to "
+                           "complete...", second=40)[:30])
+    assert log.poll() == []
+    _append(workdir, _line("Waiting up to 40m0s for bootstrapping to "
+                           "complete...", second=40)[30:])
+
+    assert [name for name, _ in log.poll()] == ["bootstrap"]
+    assert log.phase == "bootstrap"
+    assert log.durations() == {'infrastructure': 10.0, 'api': 30.0}
+
+
+def test_fatal_and_restart(workdir):
+    log = installlog.InstallLog(workdir)
+    _append(workdir, _line("Creating infrastructure resources..."),
+            _line("failed to fetch Cluster", level="fatal"))
+    log.poll()
+
+    assert log.failed
+    assert log.last_error == "failed to fetch Cluster"
+
+    _append(workdir, _line("Consuming Install Config from target directory",
+                           level="debug"))
+    log.poll()
+
+    assert log.phases == {}
+    assert log.last_error is None
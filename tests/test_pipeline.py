@@ -0,0 +1,41 @@
+import pytest
+
+from lib import pipeline
+
+
+def fail():
+    raise Exception("failed")
+
+
+def test_skips_the_steps_requiring_a_failed_one():
+    done = []
+    results = pipeline.run([
+        pipeline.Step("a", fail),
+        pipeline.Step("b", lambda: done.append("b"), requires=["a"]),
+        pipeline.Step("c", lambda: done.append("c")),
+        pipeline.Step("d", lambda: done.append("d"), requires=["b", "c"]),
+    ])
+
+    assert done == ["c"]
+    assert str(results["a"].error) == "failed"
+    assert results["b"].skipped and results["d"].skipped
+    assert results["c"].ok
+    assert [result.name for result in pipeline.failures(results)] == [
+        "a", "b", "d"
+    ]
+
+
+def test_runs_after_the_requirements():
+    done = []
+    pipeline.run([
+        pipeline.Step("second", lambda: done.append("second"),
+                      requires=["first"]),
+        pipeline.Step("first", lambda: done.append("first")),
+    ])
+
+    assert done == ["first", "second"]
+
+
+def test_unknown_requirement():
+    with pytest.raises(Exception, match="requires unknown step b"):
+        pipeline.run([pipeline.Step("a", lambda: None, requires=["b"])])
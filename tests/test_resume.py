@@ -0,0 +1,94 @@
+import argparse
+import json
+import pathlib
+import shutil
+
+import main as moumoustall
+from conftest import BASE_DOMAIN, ROOT
+from lib import state
+
+CONFIG = {
+    'clusterName': "resumed",
+    'baseDomain': BASE_DOMAIN,
+    'osCloud': "cloud",
+    'openstackBackend': "fake",
+    'externalNetwork': "public",
+    'installerVersion': "latest-4.5",
+    'template': "default",
+    'pullRequestJsonFile': "pull.secret.json",
+}
+
+
+def _launched(done=()):
+    """An install which went as far as launching the installer"""
+    config_dir = pathlib.Path("config")
+    config_dir.mkdir()
+    shutil.copy(ROOT / "config" / "install-default.yaml", config_dir)
+    (config_dir / "pull.secret.json").write_text('{"auths": {}}')
+
+    install_dir = pathlib.Path("installs") / CONFIG['clusterName']
+    (install_dir / "auth").mkdir(parents=True)
+    (install_dir / "metadata.json").write_text(
+        json.dumps({'infraID': "resumed-fake"}))
+    install_state = state.InstallState(install_dir)
+    install_state.complete("cleanup")
+    install_state.complete("floating-ips", {
+        'api': "10.0.0.1",
+        'apps': "10.0.0.2"
+    })
+    install_state.complete("dns")
+    install_state.complete("template", "rendered")
+    for step in done:
+        install_state.complete(step)
+    return install_dir
+
+
+def _args():
+    return argparse.Namespace(metrics_dir=None,
+                              no_install=False,
+                              offline=False,
+                              post_install_script="true",
+                              resume=True,
+                              retries=0,
+                              uninstall=False)
+
+
+def test_waits_for_the_launched_install(stand_ins):
+    install_dir = _launched()
+
+    moumoustall.doprofile(_args(), CONFIG)
+
+    counts = stand_ins.calls.counts()
+    assert counts["installer create cluster"] == 0
+    assert counts["installer wait-for bootstrap-complete"] == 1
+    assert counts["installer destroy bootstrap"] == 1
+    assert counts["installer wait-for install-complete"] == 1
+    # nothing is created again
+    assert counts["openstack"] == 0
+    assert counts["route53"] == 0
+    install_state = state.InstallState(install_dir)
+    assert install_state.done("create-cluster")
+    assert install_state.done("post-install")
+
+
+def test_skips_the_phases_done(stand_ins):
+    install_dir = _launched(done=["bootstrap-complete"])
+
+    moumoustall.doprofile(_args(), CONFIG)
+
+    counts = stand_ins.calls.counts()
+    assert counts["installer wait-for bootstrap-complete"] == 0
+    assert counts["installer destroy bootstrap"] == 1
+    assert counts["installer wait-for install-complete"] == 1
+    assert state.InstallState(install_dir).done("create-cluster")
+
+
+def test_nothing_to_resume_without_metadata(stand_ins):
+    install_dir = _launched()
+    (install_dir / "metadata.json").unlink()
+
+    moumoustall.doprofile(_args(), CONFIG)
+
+    counts = stand_ins.calls.counts()
+    assert counts["installer create cluster"] == 1
+    assert counts["installer wait-for bootstrap-complete"] == 0
@@ -0,0 +1,74 @@
+import os
+import pathlib
+import time
+
+from lib import scheduler
+
+
+def _config(name, os_cloud="cloud"):
+    return {'clusterName': name, 'osCloud': os_cloud}
+
+
+def exclusive(args, config):
+    """Fails if another job of the same cloud is running at the same time"""
+    running = pathlib.Path(f"running-{config['osCloud']}")
+    fd = os.open(running, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    os.close(fd)
+    time.sleep(0.3)
+    running.unlink()
+    pathlib.Path(f"done-{config['clusterName']}").touch()
+
+
+def fail_on_bad(args, config):
+    if config['clusterName'] == "bad":
+        raise Exception("bad cluster")
+    pathlib.Path(f"done-{config['clusterName']}").touch()
+
+
+def test_limits_jobs_of_the_same_cloud():
+    configs = [(f"profile{i}", _config(f"cluster{i}")) for i in range(3)]
+    configs.append(("other", _config("other", "other-cloud")))
+
+    failed = scheduler.run_profiles(exclusive, None, configs, 4,
+                                    {'osCloud': 1})
+
+    assert failed == []
+    assert sorted(path.name for path in pathlib.Path().glob("done-*")) == [
+        "done-cluster0", "done-cluster1", "done-cluster2", "done-other"
+    ]
+
+
+def test_no_limit_runs_jobs_at_the_same_time():
+    configs = [(f"profile{i}", _config(f"cluster{i}")) for i in range(3)]
+
+    failed = scheduler.run_profiles(exclusive, None, configs, 3)
+
+    assert failed
+
+
+def test_failure_is_isolated():
+    configs = [("good1", _config("good1")), ("bad", _config("bad")),
+               ("good2", _config("good2"))]
+
+    failed = scheduler.run_profiles(fail_on_bad, None, configs, 2)
+
+    assert failed == ["bad"]
+    assert pathlib.Path("done-good1").exists()
+    assert pathlib.Path("done-good2").exists()
+    assert "bad cluster" in pathlib.Path(
+        "installs/bad/moumoustall.log").read_text()
+
+
+def test_rejected_job_does_not_run():
+    def admit(job):
+        if job.name == "bad":
+            raise Exception("too big")
+        return True
+
+    configs = [("good", _config("good")), ("bad", _config("bad"))]
+
+    failed = scheduler.run_profiles(fail_on_bad, None, configs, 2, admit=admit)
+
+    assert failed == ["bad"]
+    assert pathlib.Path("done-good").exists()
+    assert not pathlib.Path("installs/bad/moumoustall.log").exists()
@@ -0,0 +1,116 @@
+import os
+import pathlib
+
+import standins
+from conftest import BASE_DOMAIN
+from lib import neutron, route53, sweeper
+
+ZONES = {
+    name: {
+        'Name': f"{name}.{BASE_DOMAIN}.",
+        'Id': f"/hostedzone/{name}"
+    }
+    for name in ("orphan", "alive", "stranger")
+}
+
+
+def _record(name):
+    return {
+        'Name': f"{name}.{BASE_DOMAIN}.",
+        'Type': 'A',
+        'TTL': 300,
+        'ResourceRecords': [{'Value': "10.0.0.1"}]
+    }
+
+
+def _cluster(name, installed):
+    install_dir = pathlib.Path("installs") / name
+    install_dir.mkdir(parents=True)
+    if installed:
+        (install_dir / "metadata.json").write_text("{}")
+    else:
+        # an install which died a long time ago
+        journal = install_dir / "moumoustall-state.json"
+        journal.write_text('{"steps": {}}')
+        os.utime(journal, (0, 0))
+
+
+def _setup(workdir):
+    calls = standins.Calls(workdir / "calls")
+    records = {
+        '/hostedzone/BENCH': [
+            _record(f"{prefix}.{name}")
+            for prefix in ("api", "\\052.apps")
+            for name in ("orphan", "alive", "stranger")
+        ]
+    }
+    route53.CLIENT_FACTORY = lambda: standins.FakeRoute53(
+        calls, BASE_DOMAIN, ZONES.values(), records)
+
+    backend = neutron.get_backend("cloud", "fake")
+    for name in ("orphan", "alive", "stranger"):
+        for description in neutron.descriptions(name, BASE_DOMAIN).values():
+            backend.create_floating_ip("public", description,
+                                       [neutron.cluster_tag(name)])
+    backend.create_floating_ip("public", "not ours")
+
+    _cluster("orphan", installed=False)
+    _cluster("alive", installed=True)
+    configs = {
+        name: {
+            'clusterName': name,
+            'baseDomain': BASE_DOMAIN,
+            'osCloud': "cloud",
+            'openstackBackend': "fake",
+            'externalNetwork': "public",
+        }
+        for name in ("orphan", "alive")
+    }
+    return calls, backend, configs
+
+
+def test_dry_run_finds_only_the_dead_clusters_of_this_machine(workdir):
+    calls, backend, configs = _setup(workdir)
+
+    result = sweeper.sweep(configs, dry_run=True)
+
+    assert list(result.orphans) == ["orphan"]
+    orphan = result.orphans["orphan"]
+    assert orphan.zones == [ZONES["orphan"]]
+    assert sorted(record['Name'] for _, record in orphan.records) == [
+        f"\\052.apps.orphan.{BASE_DOMAIN}.", f"api.orphan.{BASE_DOMAIN}."
+    ]
+    assert sorted(fip['description']
+                  for _, fip in orphan.floating_ips) == sorted(
+                      neutron.descriptions("orphan", BASE_DOMAIN).values())
+    assert result.deleted == []
+    assert len(backend.list_floating_ips()) == 7
+    assert not any(name.startswith("route53 change") or "delete" in name
+                   for name in calls.counts())
+
+
+def test_recent_install_is_alive(workdir):
+    _, _, configs = _setup(workdir)
+    os.utime(pathlib.Path("installs/orphan/moumoustall-state.json"))
+
+    assert sweeper.sweep(configs, dry_run=True).orphans == {}
+
+
+def test_sweep_removes_the_orphan(workdir):
+    calls, backend, configs = _setup(workdir)
+
+    result = sweeper.sweep(configs)
+
+    assert result.failed == {}
+    assert len(result.deleted) == 4
+    assert sorted(fip['description']
+                  for fip in backend.list_floating_ips()) == sorted(
+                      ["not ours"] + [
+                          description for name in ("alive", "stranger")
+                          for description in neutron.descriptions(
+                              name, BASE_DOMAIN).values()
+                      ])
+    counts = calls.counts()
+    assert counts["route53 delete_hosted_zone"] == 1
+    # the api and apps records of the base domain zone in one batch
+    assert counts["route53 change_resource_record_sets"] == 1
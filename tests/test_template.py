@@ -0,0 +1,39 @@
+import pathlib
+
+from lib import template
+
+
+def _configs(**templates):
+    config_dir = pathlib.Path("config")
+    config_dir.mkdir(exist_ok=True)
+    for name, text in templates.items():
+        (config_dir / f"install-{name}.yaml").write_text(text)
+    return {
+        name: {
+            'clusterName': name,
+            'baseDomain': "example.com",
+            'template': name
+        }
+        for name in templates
+    }
+
+
+def test_render_all_reports_the_invalid_templates():
+    rendered, errors = template.render_all(
+        _configs(valid="name: {{clusterName}}\napi: {{lbFloatingIP}}\n",
+                 missing="name: {{clusterName}}\nsize: {{workerSize}}\n",
+                 invalid="name: [{{clusterName}}\n"))
+
+    assert rendered == {'valid': "name: valid\napi: 0.0.0.0\n"}
+    assert sorted(errors) == ["invalid", "missing"]
+    assert str(errors["missing"]) == "Cannot replace {{workerSize}}"
+    assert "install-invalid.yaml is not valid yaml" in str(errors["invalid"])
+
+
+def test_missing_template():
+    configs = _configs()
+    configs['nothere'] = {'clusterName': "nothere", 'template': "nothere"}
+
+    _, errors = template.render_all(configs)
+
+    assert str(errors['nothere']) == "config/install-nothere.yaml doesnt exist"